@@ -5,13 +5,40 @@ from tkinter import filedialog
 from PIL import Image, ImageTk
 from reportlab.lib.pagesizes import A4
 from reportlab.pdfgen import canvas
+from backends_fiduciales import generar_imagen_aruco
+from campo_marcadores import dibujar_matriz_vectorial, matriz_modulos
+from mapa_marcadores import MapaMarcadores
+
+MAP_PATH = "mapa_marcadores.csv"  # Marker map shared with Visión UI.py
+marker_map = MapaMarcadores.cargar(MAP_PATH)
+marker_modules = None  # Module matrix of the last generated marker
+
+def register_marker(sidelength, x, y, marker_id=None):
+    # Store the marker position in the map so the code only has to carry its ID
+    try:
+        if marker_id is None:
+            marker_id = marker_map.registrar(sidelength, x, y)
+        else:
+            marker_map.agregar(marker_id, sidelength, x, y)
+    except ValueError:
+        return None
+    marker_map.guardar(MAP_PATH)
+    return marker_id
 
 def generate_qr_code():
     x = x_input.get()
     y = y_input.get()
     sidelength = sidelength_var.get()
+    if marker_type_var.get() == "ArUco":
+        generate_aruco_marker()
+        return
     if x and y and sidelength:
         qr_text = f'{sidelength},{x},{y}'  # Updated format to "a,b,c"
+        if id_only_var.get():
+            marker_id = register_marker(sidelength, x, y)
+            if marker_id is None:
+                return
+            qr_text = str(marker_id)  # ID-only payload: smaller QR version with bigger modules
         qr = qrcode.QRCode(
             version=1,
             error_correction=qrcode.constants.ERROR_CORRECT_L,
@@ -21,14 +48,35 @@ def generate_qr_code():
         qr.add_data(qr_text)
         qr.make(fit=True)
 
-        global img
+        global img, marker_modules
         img = qr.make_image(fill_color="black", back_color="white")
+        marker_modules = matriz_modulos("QR", qr_text)  # Module matrix for the vector PDF
         img_path = "qr_code.png"
         img.save(img_path)  # Save QR code as PNG
 
         # Display QR code
         display_qr_code(img_path)
 
+def generate_aruco_marker():
+    marker_id = id_input.get()
+    x = x_input.get()
+    y = y_input.get()
+    sidelength = sidelength_var.get()
+    if x and y and sidelength:
+        marker_id = register_marker(sidelength, x, y, int(marker_id) if marker_id.isdigit() else None)
+        marker_id = "" if marker_id is None else str(marker_id)
+        id_input.delete(0, tk.END)
+        id_input.insert(0, marker_id)
+    if marker_id.isdigit():
+        # Square fiducial for the "aruco" backend: the payload is only the ID
+        global img, marker_modules
+        img = Image.fromarray(generar_imagen_aruco(int(marker_id), 250))
+        marker_modules = matriz_modulos("ArUco", marker_id)
+        img_path = "qr_code.png"
+        img.save(img_path)
+
+        display_qr_code(img_path)
+
 def display_qr_code(img_path):
     img = Image.open(img_path)
     img = img.resize((250, 250), Image.Resampling.LANCZOS)
@@ -42,6 +90,8 @@ def save_pdf():
     sidelength = sidelength_var.get()
     if x and y and sidelength:
         qr_text = f'{sidelength},{x},{y}'  # Updated format to "a,b,c"
+        if marker_type_var.get() == "ArUco":
+            qr_text = f'aruco_{id_input.get()}_{qr_text}'
 
         # Set default file name and initial directory
         default_file_name = qr_text + ".pdf"
@@ -63,14 +113,18 @@ def save_pdf():
             # Center the QR code on the page
             x = (width - qr_size_points) / 2
             y = (height - qr_size_points) / 2
-            img_path = "qr_code.png"
-            c.drawImage(img_path, x, y, width=qr_size_points, height=qr_size_points)
+            if vector_pdf_var.get() and marker_modules is not None:
+                # Modules drawn as vector rectangles: crisp edges at any printed size
+                dibujar_matriz_vectorial(c, marker_modules, x, y, qr_size_points)
+            else:
+                img_path = "qr_code.png"
+                c.drawImage(img_path, x, y, width=qr_size_points, height=qr_size_points)
             c.save()
 
 # Set up GUI
 root = tk.Tk()
 root.title("QR Code Generator")
-root.geometry("350x550")  # Set window size
+root.geometry("350x680")  # Set window size
 
 font = ('Arial', 10)
 
@@ -98,8 +152,29 @@ radiobutton_8.grid(row=2, column=1)
 radiobutton_18 = tk.Radiobutton(input_frame, text="18", variable=sidelength_var, value="18", font=font)
 radiobutton_18.grid(row=3, column=1)
 
+marker_type_label = tk.Label(input_frame, text="Marker Type:", font=font)
+marker_type_label.grid(row=4, column=0, pady=5)
+marker_type_var = tk.StringVar(value="QR")
+radiobutton_qr = tk.Radiobutton(input_frame, text="QR", variable=marker_type_var, value="QR", font=font)
+radiobutton_qr.grid(row=4, column=1)
+radiobutton_aruco = tk.Radiobutton(input_frame, text="ArUco", variable=marker_type_var, value="ArUco", font=font)
+radiobutton_aruco.grid(row=5, column=1)
+
+id_label = tk.Label(input_frame, text="ArUco ID:", font=font)
+id_label.grid(row=6, column=0, pady=5)
+id_input = tk.Entry(input_frame, font=font)
+id_input.grid(row=6, column=1, pady=5)
+
+id_only_var = tk.BooleanVar(value=True)
+id_only_check = tk.Checkbutton(input_frame, text="ID only (marker map)", variable=id_only_var, font=font)
+id_only_check.grid(row=7, column=0, columnspan=2, pady=5)
+
+vector_pdf_var = tk.BooleanVar(value=False)
+vector_pdf_check = tk.Checkbutton(input_frame, text="Vector PDF", variable=vector_pdf_var, font=font)
+vector_pdf_check.grid(row=8, column=0, columnspan=2, pady=5)
+
 generate_button = tk.Button(input_frame, text="Generate QR Code", font=font, command=generate_qr_code)
-generate_button.grid(row=4, column=0, columnspan=2, pady=10)
+generate_button.grid(row=9, column=0, columnspan=2, pady=10)
 
 # QR Code Display Frame
 qr_frame = tk.Frame(root)
@@ -1,10 +1,12 @@
-import os
-import qrcode
+import numpy as np
 import tkinter as tk
+from collections import OrderedDict
 from tkinter import filedialog, messagebox, ttk
 from PIL import Image, ImageTk
 from reportlab.lib.pagesizes import A4
 from reportlab.pdfgen import canvas
+from campo_marcadores import dibujar_matriz_vectorial, matriz_modulos
+from mapa_marcadores import MapaMarcadores
 
 class QRCodeGeneratorApp:
     def __init__(self, root):
@@ -15,11 +17,16 @@ class QRCodeGeneratorApp:
         # Constantes
         self.DEFAULT_QR_SIZE = 10
         self.DEFAULT_QRS_PER_ROW = 3
-        
+        self.UPDATE_DELAY_MS = 150  # Espera tras la última tecla o zoom antes de redibujar
+        self.IMAGE_CACHE_SIZE = 256
+        self.QR_BORDER = 4  # Módulos de margen blanco
+        self.ARUCO_BORDER = 1
+        self.ARUCO_MODULE_SCALE = 4  # Píxeles por módulo ArUco por cada paso de zoom
+
         # Atributos
         self.qr_size = self.DEFAULT_QR_SIZE
         self.text_var = tk.StringVar(value="default")
-        self.text_var.trace_add("write", self.generate_qr)
+        self.text_var.trace_add("write", self.on_text_change)
         self.qr_entries = {}
         self.num_additional_qrs = 0
         self.text_entry_visible = False
@@ -28,6 +35,14 @@ class QRCodeGeneratorApp:
         self.qr_labels = {}
         self.qrs_per_row = self.DEFAULT_QRS_PER_ROW
         self.width_entry_value = tk.StringVar(value="10")
+        self.marker_type = tk.StringVar(value="QR")
+        self.marker_type.trace_add("write", self.schedule_all_updates)
+
+        # Cachés: la matriz de módulos sólo se codifica una vez por contenido y el zoom sólo la reescala
+        self.module_cache = {}  # (tipo, contenido) -> matriz de módulos (uint8, 0 negro / 255 blanco)
+        self.image_cache = OrderedDict()  # (tipo, contenido, box_size, borde) -> imagen PIL
+        self.pending_indices = set()
+        self.pending_update = None
 
         self.setup_ui()
 
@@ -42,7 +57,9 @@ class QRCodeGeneratorApp:
 
         file_menu = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label="File", menu=file_menu)
+        file_menu.add_command(label="Import marker map", command=self.load_marker_map)
         file_menu.add_command(label="Export as PDF file", command=self.save_as_pdf)
+        file_menu.add_command(label="Export as vector PDF file", command=lambda: self.save_as_pdf(vector=True))
         file_menu.add_separator()
         file_menu.add_command(label="Exit", command=self.root.destroy)
 
@@ -72,6 +89,13 @@ class QRCodeGeneratorApp:
         self.width_entry = ttk.Entry(width_entry_frame, textvariable=self.width_entry_value)
         self.width_entry.pack(side=tk.LEFT)
 
+        marker_type_frame = ttk.Frame(button_frame)
+        marker_type_frame.pack(side=tk.LEFT, padx=10)
+
+        ttk.Label(marker_type_frame, text="Tipo").pack(side=tk.LEFT)
+        ttk.Combobox(marker_type_frame, textvariable=self.marker_type, values=("QR", "ArUco"),
+                     state="readonly", width=6).pack(side=tk.LEFT)
+
     def create_qr_frame(self):
         self.qr_frame = ttk.Frame(self.root)
         self.qr_frame.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
@@ -88,47 +112,104 @@ class QRCodeGeneratorApp:
         except ValueError:
             messagebox.showerror("Error", "Ingrese un valor numérico válido para la cantidad de QR por fila.")
 
+    def marker_border(self):
+        return self.ARUCO_BORDER if self.marker_type.get() == "ArUco" else self.QR_BORDER
+
+    def get_module_matrix(self, data):
+        key = (self.marker_type.get(), data)
+        if key not in self.module_cache:
+            # Los marcadores ArUco sólo llevan el ID; si el texto no es un número no se genera nada
+            matrix = None
+            if key[0] != "ArUco" or data.isdigit():
+                matrix = matriz_modulos(key[0], data, self.marker_border())
+            self.module_cache[key] = matrix
+        return self.module_cache[key]
+
+    def make_marker_image(self, data, box_size):
+        key = (self.marker_type.get(), data, box_size, self.marker_border())
+        if key in self.image_cache:
+            self.image_cache.move_to_end(key)
+            return self.image_cache[key]
+
+        matrix = self.get_module_matrix(data)
+        if matrix is None:
+            return None
+        scale = box_size * self.ARUCO_MODULE_SCALE if key[0] == "ArUco" else box_size
+        img = Image.fromarray(np.kron(matrix, np.ones((scale, scale), dtype=np.uint8)))
+
+        self.image_cache[key] = img
+        if len(self.image_cache) > self.IMAGE_CACHE_SIZE:
+            self.image_cache.popitem(last=False)
+        return img
+
+    def render_qr(self, index):
+        data = self.qr_entries[index].get()
+        img = self.make_marker_image(data, self.qr_size) if data else None
+        if img is None:
+            return
+
+        img = ImageTk.PhotoImage(img)
+        if index not in self.qr_labels:
+            qr_label = ttk.Label(self.qr_frame, image=img, relief="solid")
+            qr_label.bind("<Button-1>", lambda event, qr_index=index: self.toggle_text_entry(qr_index, event.x_root, event.y_root))
+            qr_label.grid(row=(index - 1) // self.qrs_per_row, column=(index - 1) % self.qrs_per_row, padx=10, pady=10, sticky="nsew")
+            self.qr_labels[index] = qr_label
+        else:
+            self.qr_labels[index].config(image=img)
+        self.qr_labels[index].image = img
+
     def generate_qr(self, *args):
-        for index, text_var in self.qr_entries.items():
-            data = text_var.get()
-
-            if data:
-                qr = qrcode.QRCode(
-                    version=1,
-                    error_correction=qrcode.constants.ERROR_CORRECT_L,
-                    box_size=self.qr_size,
-                    border=4,
-                )
-                qr.add_data(data)
-                qr.make(fit=True)
-                img = qr.make_image(fill_color="black", back_color="white")
-
-                img = ImageTk.PhotoImage(img)
-                if index not in self.qr_labels:
-                    qr_label = ttk.Label(self.qr_frame, image=img, relief="solid")
-                    qr_label.image = img
-                    qr_label.bind("<Button-1>", lambda event, qr_index=index: self.toggle_text_entry(qr_index, event.x_root, event.y_root))
-                    qr_label.grid(row=(index - 1) // self.qrs_per_row, column=(index - 1) % self.qrs_per_row, padx=10, pady=10, sticky="nsew")
-                    self.qr_labels[index] = qr_label
-                else:
-                    row = (index - 1) // self.qrs_per_row
-                    column = (index - 1) % self.qrs_per_row
-                    self.qr_labels[index].config(image=img)
-                    self.qr_labels[index].image = img
-                    self.qr_labels[index].grid(row=row, column=column, padx=10, pady=10, sticky="nsew")
-
-                    # Actualizar posición del cuadro de texto si está visible
-                    if self.text_entry_visible and index == self.current_qr_index:
-                        self.update_text_entry_position(index)
+        # Redibujado inmediato de todas las etiquetas (al cambiar la distribución o borrar)
+        if self.pending_update is not None:
+            self.root.after_cancel(self.pending_update)
+            self.pending_update = None
+        self.pending_indices.clear()
+        for index in self.qr_entries:
+            self.render_qr(index)
+        self.regrid_qrs()
+
+    def regrid_qrs(self):
+        for index, qr_label in self.qr_labels.items():
+            qr_label.grid(row=(index - 1) // self.qrs_per_row, column=(index - 1) % self.qrs_per_row, padx=10, pady=10, sticky="nsew")
+        self.refresh_text_entry()
+
+    def refresh_text_entry(self):
+        # Actualizar posición del cuadro de texto si está visible
+        if self.text_entry_visible and self.current_qr_index in self.qr_labels:
+            self.qr_frame.update_idletasks()
+            self.update_text_entry_position(self.current_qr_index)
+
+    def schedule_update(self, index):
+        # Cada tecla reprograma el redibujado; sólo se vuelve a dibujar el QR que ha cambiado
+        self.pending_indices.add(index)
+        if self.pending_update is not None:
+            self.root.after_cancel(self.pending_update)
+        self.pending_update = self.root.after(self.UPDATE_DELAY_MS, self.flush_updates)
+
+    def schedule_all_updates(self, *args):
+        for index in self.qr_entries:
+            self.schedule_update(index)
+
+    def flush_updates(self):
+        self.pending_update = None
+        indices, self.pending_indices = self.pending_indices, set()
+        for index in sorted(indices):
+            if index in self.qr_entries:
+                self.render_qr(index)
+        self.refresh_text_entry()
+
+    def on_text_change(self, *args):
+        if self.text_entry_visible and self.current_qr_index is not None:
+            self.qr_entries[self.current_qr_index].set(self.text_var.get())
 
     def zoom_in(self):
         self.qr_size += 1
-        self.generate_qr()
+        self.schedule_all_updates()
 
     def zoom_out(self):
         if self.qr_size > 1:
             self.qr_size -= 1
-            self.generate_qr()
+            self.schedule_all_updates()
 
     def toggle_text_entry(self, qr_index, x, y):
         if self.current_qr_index is None or qr_index != self.current_qr_index:
@@ -168,36 +249,37 @@ class QRCodeGeneratorApp:
         self.num_additional_qrs = 0
         self.generate_qr()
 
-    def generate_additional_qr(self):
+    def load_marker_map(self):
+        # Un QR por cada marcador del mapa, con sólo su ID como contenido
+        map_filename = filedialog.askopenfilename(filetypes=[("Marker map", "*.csv")])
+        if map_filename:
+            try:
+                marker_map = MapaMarcadores.cargar(map_filename)
+            except (KeyError, ValueError):
+                messagebox.showerror("Error", "El fichero no es un mapa de marcadores válido.")
+                return
+            self.delete_all_qrs()
+            for marker_id in marker_map:
+                self.generate_additional_qr(str(marker_id))
+
+    def generate_additional_qr(self, data="vacio"):
         self.num_additional_qrs += 1
         index = len(self.qr_entries) + 1
-        text_var = tk.StringVar(value="vacio")
-        text_var.trace_add("write", self.generate_qr)
+        text_var = tk.StringVar(value=data)
+        text_var.trace_add("write", lambda *args, qr_index=index: self.schedule_update(qr_index))
         self.qr_entries[index] = text_var
-        self.generate_qr()
+        self.render_qr(index)
 
-    def save_as_pdf(self):
+    def save_as_pdf(self, vector=False):
         pdf_filename = filedialog.asksaveasfilename(defaultextension=".pdf", filetypes=[("PDF files", "*.pdf")])
         if pdf_filename:
             c = canvas.Canvas(pdf_filename, pagesize=A4)
 
             for index, text_var in self.qr_entries.items():
                 data = text_var.get()
+                img = self.make_marker_image(data, self.qr_size) if data else None
 
-                if data:
-                    qr = qrcode.QRCode(
-                        version=1,
-                        error_correction=qrcode.constants.ERROR_CORRECT_L,
-                        box_size=self.qr_size,
-                        border=4,
-                    )
-                    qr.add_data(data)
-                    qr.make(fit=True)
-                    img = qr.make_image(fill_color="black", back_color="white")
-
-                    img_filename = f"temp_qr_{index}.png"
-                    img.save(img_filename)
-
+                if img is not None:
                     # Centrar QR en la hoja y ajustar el tamaño en puntos
                     qr_width, qr_height = img.size
                     pdf_width, pdf_height = A4
@@ -210,8 +292,11 @@ class QRCodeGeneratorApp:
                     x_offset = (pdf_width - width_in_points) / 2
                     y_offset = (pdf_height - height_in_points) / 2
 
-                    c.drawInlineImage(img_filename, x_offset, y_offset, width=width_in_points, height=height_in_points)
-                    os.remove(img_filename)
+                    if vector:
+                        # Módulos como rectángulos vectoriales: bordes nítidos a cualquier tamaño
+                        dibujar_matriz_vectorial(c, self.get_module_matrix(data), x_offset, y_offset, width_in_points)
+                    else:
+                        c.drawInlineImage(img, x_offset, y_offset, width=width_in_points, height=height_in_points)
 
                     c.showPage()
 
@@ -34,187 +34,373 @@
 
 # Variables Configurables
 video_source = 0  # Número del dispositivo de la cámara (0 para la cámara predeterminada)
-angulo_de_vision = 0.74  # Ángulo de visión de la cámara en radianes
-lado_cm = 6  # Este valor se actualiza automáticamente con el lado real del código QR
+ruta_perfil_camara = "perfil_camara.json"  # Última configuración buena de la cámara, que se reaplica al arrancar (None para negociarla siempre)
+longitud_focal = 850.0  # Longitud focal en píxeles de la cámara ideal sin calibración (si angulo_de_vision es None)
+distancia_maxima = 200.0  # Distancia máxima que se pasa al detector (en cm)
+angulo_de_vision = 0.74  # Ángulo de visión vertical en radianes de la cámara ideal sin calibración (None para usar longitud_focal)
+resolucion_referencia = (640, 480)  # Resolución (ancho, alto) a la que corresponden angulo_de_vision y longitud_focal
+ruta_calibracion = "calibracion_camara.json"  # Intrínsecos y distorsión de calibracion_camara.py (si no existe, longitud_focal)
+vista_rectificada = False  # Mostrar la vista previa sin distorsión (la detección sólo corrige las esquinas)
+modo_seguimiento = True  # Decodificar sólo una ventana alrededor del último QR detectado
+reacquisicion_cada = 15  # Cada cuántos fotogramas se vuelve a buscar en la imagen completa
+usar_gris = True  # Convertir el fotograma a escala de grises una sola vez antes de decodificar
+escalas_decodificacion = (0.5, 1.0)  # Niveles de la pirámide que se prueban, del más barato al más caro
+filtro_nitidez = True  # Omitir sin decodificar los fotogramas movidos o mal expuestos (umbral adaptativo)
+planificador_activo = True  # Ajustar en marcha resolución, formato y escalas de decodificación
+presupuesto_latencia = 0.1  # Segundos de latencia (p95) permitidos desde la captura hasta la pose
+frecuencia_minima_pose = 10.0  # Poses por segundo por debajo de las que el planificador baja la calidad
+modo_sin_pantalla = False  # En el dron: no se dibuja ni se muestra nada, sólo se publica la pose
+destino_pose = None  # "stdout", "udp://host:puerto" o "unix:///ruta" (en modo sin pantalla, "stdout" por defecto)
+destino_serie = None  # Enlace binario con la placa de control: "serial:///dev/ttyACM0", ruta de un pty o "tcp://host:puerto"
+baudios_serie = 115200  # Velocidad del puerto serie
+vista_previa_cada = 0  # Segundos entre vistas previas en modo sin pantalla (0 para desactivarlas)
+destino_vista_previa = None  # Vista previa remota: "http://0.0.0.0:8080" (MJPEG) o "udp://host:puerto" (None para desactivarla)
+frecuencia_vista_previa = 10.0  # Fotogramas por segundo máximos de la vista previa remota
+ancho_vista_previa = 640  # Ancho máximo en píxeles de la vista previa remota
+vista_previa_anotada = True  # Enviar el fotograma anotado (False para enviarlo en bruto, sin coste de anotación)
+backend_marcadores = "pyzbar"  # "pyzbar", "opencv_qr" o "aruco" (ArUco/AprilTag, según diccionario_aruco)
+diccionario_aruco = "DICT_4X4_50"  # Diccionario de cv2.aruco para el backend "aruco"
+ruta_mapa_marcadores = "mapa_marcadores.csv"  # Mapa ID -> (lado, x, y) de los marcadores que sólo llevan un ID
+instrumentacion_activa = False  # Medir el tiempo de cada etapa del bucle (p50/p95/p99)
+periodo_estadisticas = 5.0  # Segundos entre resúmenes de la instrumentación
+ruta_estadisticas = None  # Fichero JSONL para los resúmenes (None para sacarlos por stderr)
+panel_estadisticas = True  # Dibujar el último resumen en la ventana
+procesos_decodificacion = 0  # Procesos que decodifican en paralelo (0 para decodificar en el bucle principal)
+estimador_activo = True  # Filtrar la pose con un Kalman de velocidad constante y publicarla extrapolada
+frecuencia_salida_pose = 50.0  # Poses extrapoladas por segundo que se publican con el estimador activo
+antiguedad_maxima_pose = 0.5  # Segundos sin medidas tras los que se deja de publicar la pose extrapolada
+ruta_registro_vuelo = None  # Fichero binario con cada detección y pose para analizar después (None para no registrar)
+ruta_grabacion = None  # Carpeta donde grabar los fotogramas en bruto para benchmark_detector.py (None para no grabar)
 
 import cv2
-from pyzbar import pyzbar
-import numpy as np
+from backends_fiduciales import crear_backend
+from mapa_marcadores import MapaMarcadores
 import os
-import math
-
-# Configuración de la interfaz gráfica
-fuente = cv2.FONT_HERSHEY_SIMPLEX
-tamaño_fuente = 0.5
-tamaño_fuente_grande = 0.75  
-grosor_fuente = 1
-grosor_fuente_grande = 2 
-color_fuente = (255, 255, 255)
-color_contorno_fuente = (0, 0, 0)
+import threading
+import time
+from captura import CapturaHilo
+from instrumentacion import Instrumentacion, ResumenPeriodico, dibujar_panel
+from calibracion_camara import CalibracionCamara
+from detector_qr import (DetectorQR, fuente, tamaño_fuente, tamaño_fuente_grande, grosor_fuente,
+                         grosor_fuente_grande, color_fuente, color_contorno_fuente)
+from salida_pose import PublicadorMultiple, PublicadorPose, registro_pose
+from estimador_pose import FiltroKalmanVelocidad, SalidaFrecuenciaFija
+from planificador_latencia import NIVELES_POR_DEFECTO, PlanificadorLatencia
+from perfil_camara import PerfilCamara, nombre_backend, segundos_desde_inicio
+# Los módulos de las funciones opcionales (pool, enlace serie, vista previa remota, grabación y registro de
+# vuelo) se importan dentro de main() sólo si se activan, para no retrasar el arranque
 
 # Fuente del script
 nombre_script = os.path.basename(__file__)
 
-# Definiciones de Funciones
-def extraer_valores_desde_qr(texto_qr):
-    """
-    Función para extraer los valores (longitud, coordenadas X e Y) desde un código QR.
-    """
-    try:
-        valores = texto_qr.split(',')
-        longitud = float(valores[0])
-        x = float(valores[1])
-        y = float(valores[2])
-        return longitud, x, y
-    except Exception as e:
-        print(f"Error al extraer los valores: {e}")
-        return None, None, None
-
-class DetectorQR:
+def mostrar_frame(frame_anotado, coordenadas_dron, calidad, lineas_estado, resumen, instrumentacion, ventana=True):
     """
-    Clase que se encarga de detectar y procesar los códigos QR en una imagen.
+    Función para superponer los datos generales y la pose sobre el fotograma y mostrarlo.
+    Con `ventana` a False sólo se superponen los datos (para la vista previa remota).
     """
-    def __init__(self, longitud_focal, distancia_maxima):
-        self.longitud_focal = longitud_focal
-        self.distancia_maxima = distancia_maxima
-
-    def encontrar_codigos_qr(self, frame):
-        """
-        Función para encontrar códigos QR en una imagen y procesarlos.
-        """
-        global lado_cm
-        objetos_decodificados = pyzbar.decode(frame)
-        coordenadas_dron = None
-        for obj in objetos_decodificados:
-            puntos = obj.polygon
-            if len(puntos) > 4:
-                hull = cv2.convexHull(np.array([punto for punto in puntos], dtype=np.float32))
-                puntos = hull
-
-            longitud, x, y = extraer_valores_desde_qr(obj.data.decode('utf-8'))
-            if longitud is not None and x is not None and y is not None:
-                lado_cm = longitud  
-
-            longitud_lado = self.calcular_longitud_lado(puntos)
-            altura_imagen_cm = (frame.shape[0] / longitud_lado) * lado_cm
-            distancia = ((altura_imagen_cm / 2) * math.sin(90 - (angulo_de_vision / 2))) / math.sin(angulo_de_vision / 2)
-
-            cv2.drawContours(frame, [np.int0(puntos)], 0, (255, 0, 255), 2)
-
-            ubicacion_texto_longitud_lado = (obj.rect.left, obj.rect.top - 10)
-            cv2.putText(frame, f"Longitud del lado: {longitud_lado:.2f} cm", ubicacion_texto_longitud_lado,
-                        fuente, tamaño_fuente, color_contorno_fuente, grosor_fuente + 2, cv2.LINE_AA)
-            cv2.putText(frame, f"Longitud del lado: {longitud_lado:.2f} cm", ubicacion_texto_longitud_lado,
-                        fuente, tamaño_fuente, color_fuente, grosor_fuente, cv2.LINE_AA)
-
-            ubicacion_texto_altura_imagen = (obj.rect.left, obj.rect.top - 30)
-            cv2.putText(frame, f"Altura de la imagen: {altura_imagen_cm:.2f} cm", ubicacion_texto_altura_imagen,
-                        fuente, tamaño_fuente, color_contorno_fuente, grosor_fuente + 2, cv2.LINE_AA)
-            cv2.putText(frame, f"Altura de la imagen: {altura_imagen_cm:.2f} cm", ubicacion_texto_altura_imagen,
-                        fuente, tamaño_fuente, color_fuente, grosor_fuente, cv2.LINE_AA)
-
-            ubicacion_texto_distancia = (obj.rect.left, obj.rect.top - 50)
-            cv2.putText(frame, f"Distancia: {distancia:.2f} cm", ubicacion_texto_distancia,
-                        fuente, tamaño_fuente, color_contorno_fuente, grosor_fuente + 2, cv2.LINE_AA)
-            cv2.putText(frame, f"Distancia: {distancia:.2f} cm", ubicacion_texto_distancia,
-                        fuente, tamaño_fuente, color_fuente, grosor_fuente, cv2.LINE_AA)
-
-            x_cm, y_cm, vector = self.calcular_vector(puntos, longitud_lado, x, y)
-            coordenadas_dron = (x_cm, y_cm, distancia / 100.0)  
-
-            texto_qr = obj.data.decode('utf-8')
-            ubicacion_texto_qr = (obj.rect.left, obj.rect.top - 70)
-            cv2.putText(frame, f"Código QR: {texto_qr}", ubicacion_texto_qr,
-                        fuente, tamaño_fuente, color_contorno_fuente, grosor_fuente + 2, cv2.LINE_AA)
-            cv2.putText(frame, f"Código QR: {texto_qr}", ubicacion_texto_qr,
-                        fuente, tamaño_fuente, color_fuente, grosor_fuente, cv2.LINE_AA)
-
-        return objetos_decodificados, frame, coordenadas_dron
-
-    def calcular_longitud_lado(self, puntos):
-        """
-        Función para calcular la longitud del lado de un cuadrilátero a partir de sus puntos.
-        """
-        return max([np.linalg.norm(np.array(puntos[i]) - np.array(puntos[(i + 1) % 4])) for i in range(4)])
-
-    def calcular_vector(self, puntos, longitud_lado, x_ref, y_ref):
-        """
-        Función para calcular un vector a partir de puntos de referencia y coordenadas.
-        """
-        mitad_frame = (frame.shape[1] // 2, frame.shape[0] // 2)
-        mitad_qr = np.mean(puntos, axis=0, dtype=np.intp)
-
-        h_px = mitad_frame[0] - mitad_qr[0]  
-        v_px = mitad_qr[1] - mitad_frame[1]
-
-        pixeles_por_cm = longitud_lado / lado_cm
-        h_cm = h_px / pixeles_por_cm
-        v_cm = v_px / pixeles_por_cm
-
-        x_ref_cm = x_ref * 100
-        y_ref_cm = y_ref * 100
-
-        x_final = x_ref_cm + h_cm
-        y_final = y_ref_cm + v_cm
-
-        cv2.line(frame, mitad_frame, tuple(mitad_qr), (0, 255, 0), 2)
-
-        offset_texto_x = 10  
-        offset_texto_y = 10  
-        ubicacion_texto_vector = (mitad_qr[0] + offset_texto_x, mitad_qr[1] + offset_texto_y)
-        
-        texto_vector = f"Vec:({x_final:.2f},{y_final:.2f}) cm"
-        cv2.putText(frame, texto_vector, ubicacion_texto_vector,
-                    fuente, tamaño_fuente, color_contorno_fuente, grosor_fuente + 2, cv2.LINE_AA)
-        cv2.putText(frame, texto_vector, ubicacion_texto_vector,
-                    fuente, tamaño_fuente, color_fuente, grosor_fuente, cv2.LINE_AA)
-
-        return x_final / 100.0, y_final / 100.0, texto_vector  
-
-# Inicialización de Variables
-video_source = 0
-longitud_focal = 850.0
-distancia_maxima = 200.0
-angulo_de_vision = 0.74
-lado_cm = 6  
-
-# Inicialización del Detector QR
-detector_qr = DetectorQR(longitud_focal, distancia_maxima)
-
-# Inicializar captura de video de la cámara
-cap = cv2.VideoCapture(video_source)
-cap.set(cv2.CAP_PROP_AUTOFOCUS, 1)  
-
-# Obtener dimensiones de la cámara
-_, frame = cap.read()
-altura, ancho, _ = frame.shape
-dimensiones_camara = f"Dimensiones de la cámara: {ancho}x{altura}"
-
-# Bucle Principal (Procesamiento de Video)
-while True:
-    ret, frame = cap.read()
-    if ret:
-        objetos_decodificados, frame_anotado, coordenadas_dron = detector_qr.encontrar_codigos_qr(frame)
-
-        cv2.putText(frame_anotado, nombre_script, (10, frame_anotado.shape[0] - 10),
-                    fuente, tamaño_fuente, (192, 192, 192, 128), grosor_fuente, cv2.LINE_AA)
-        cv2.putText(frame_anotado, dimensiones_camara, (10, frame_anotado.shape[0] - 30),
-                    fuente, tamaño_fuente, (192, 192, 192, 128), grosor_fuente, cv2.LINE_AA)
+    with instrumentacion.medir('superposicion'):
+        for i, linea in enumerate(lineas_estado):
+            cv2.putText(frame_anotado, linea, (10, frame_anotado.shape[0] - 10 - 20 * i),
+                        fuente, tamaño_fuente, (192, 192, 192, 128), grosor_fuente, cv2.LINE_AA)
 
         # Mostrar coordenadas del dron en texto grande
         if coordenadas_dron:
             x, y, z = coordenadas_dron
-            texto_coordenadas_dron = f"x={x:.3f} m, y={y:.3f} m, z={z:.3f} m"
+            texto_coordenadas_dron = f"x={x:.3f} m, y={y:.3f} m, z={z:.3f} m (calidad {calidad:.2f})"
             cv2.putText(frame_anotado, texto_coordenadas_dron, (10, 50),
                         fuente, tamaño_fuente_grande, color_contorno_fuente, grosor_fuente_grande + 2, cv2.LINE_AA)
             cv2.putText(frame_anotado, texto_coordenadas_dron, (10, 50),
                         fuente, tamaño_fuente_grande, color_fuente, grosor_fuente_grande, cv2.LINE_AA)
 
-        cv2.imshow('Frame', frame_anotado)
+        if resumen is not None:
+            dibujar_panel(frame_anotado, resumen, fuente, tamaño_fuente, color_fuente, grosor_fuente)
 
-        key = cv2.waitKey(1) & 0xFF
-        if key == ord('q'):
-            break
+    if ventana:
+        with instrumentacion.medir('imshow'):
+            cv2.imshow('Frame', frame_anotado)
+
+def abrir_camara(perfil, instrumentacion):
+    """
+    Función para abrir la cámara: directamente con el perfil guardado si lo hay o, si no, dejando que
+    OpenCV elija el backend y negocie el formato.
+    """
+    cap = perfil.abrir() if perfil is not None else cv2.VideoCapture(video_source)
+    cap.set(cv2.CAP_PROP_AUTOFOCUS, 1)
+    return cap, CapturaHilo(cap, instrumentacion=instrumentacion)
 
-cap.release()
-cv2.destroyAllWindows()
+def guardar_perfil(perfil, calibracion, resolucion, ruta_tabla):
+    """
+    Función para guardar el perfil de la cámara (y la tabla de corrección de su resolución) en segundo plano.
+    """
+    perfil.guardar(ruta_perfil_camara)
+    if ruta_tabla and calibracion is not None:
+        calibracion.guardar_tabla(resolucion, ruta_tabla)
+
+def main():
+    """
+    Función principal: abre la cámara, arranca la captura y ejecuta el bucle de localización.
+    Al estar dentro de una función, el script se puede importar sin abrir la cámara.
+    """
+    # Instrumentación de las etapas del bucle (sin coste apreciable si está desactivada)
+    instrumentacion = Instrumentacion(activa=instrumentacion_activa)
+    resumen_periodico = ResumenPeriodico(instrumentacion, periodo_estadisticas, ruta_estadisticas)
+
+    # Inicialización del Detector QR (el mapa de marcadores se carga una sola vez)
+    mapa_marcadores = MapaMarcadores.cargar(ruta_mapa_marcadores)
+    opciones_backend = {"nombre_diccionario": diccionario_aruco} if backend_marcadores == "aruco" else {}
+    backend = crear_backend(backend_marcadores, **opciones_backend)
+    calibracion = CalibracionCamara.cargar(ruta_calibracion)
+    detector_qr = DetectorQR(longitud_focal, distancia_maxima, modo_seguimiento, reacquisicion_cada,
+                             usar_gris=usar_gris, escalas_decodificacion=escalas_decodificacion,
+                             dibujar=not modo_sin_pantalla, mapa=mapa_marcadores, backend=backend,
+                             angulo_de_vision=angulo_de_vision, instrumentacion=instrumentacion,
+                             filtro_nitidez=filtro_nitidez, calibracion=calibracion,
+                             resolucion_referencia=resolucion_referencia)
+
+    # Publicador de la pose (en modo sin pantalla es la única salida)
+    destino = destino_pose or ("stdout" if modo_sin_pantalla else None)
+    publicadores = [PublicadorPose(destino)] if destino else []
+
+    # Enlace binario con la placa de control (hilo escritor propio, nunca bloquea el bucle)
+    enlace_serie = None
+    if destino_serie:
+        from enlace_serie import EnlaceSerie
+        enlace_serie = EnlaceSerie(destino_serie, baudios_serie,
+                                   instrumentacion=instrumentacion if instrumentacion_activa else None)
+        publicadores.append(enlace_serie)
+    publicador_pose = PublicadorMultiple(publicadores) if publicadores else None
+
+    # Estimador de pose: con él, la pose se publica extrapolada al instante actual a frecuencia fija
+    estimador = FiltroKalmanVelocidad() if estimador_activo else None
+    salida_fija = None
+    if estimador is not None and publicador_pose is not None:
+        salida_fija = SalidaFrecuenciaFija(estimador, publicador_pose, frecuencia_salida_pose,
+                                           antiguedad_maxima_pose).iniciar()
+
+    # Vista previa remota para la estación de tierra (se comprime en un hilo propio y salta fotogramas)
+    servidor_vista = None
+    if destino_vista_previa:
+        from servidor_vista_previa import ServidorVistaPrevia
+        servidor_vista = ServidorVistaPrevia(destino_vista_previa, frecuencia_vista_previa, ancho_vista_previa,
+                                             instrumentacion=instrumentacion)
+
+    # Grabación de los fotogramas en bruto (para reproducirlos después en el banco de pruebas)
+    grabador = None
+    if ruta_grabacion:
+        from grabacion import GrabadorFrames
+        grabador = GrabadorFrames(ruta_grabacion)
+
+    # Registro de vuelo binario (anotar un fotograma es copiar unos bytes a un fichero proyectado en memoria)
+    registro_vuelo = None
+    if ruta_registro_vuelo:
+        from registro_vuelo import RegistroVuelo
+        registro_vuelo = RegistroVuelo(ruta_registro_vuelo, mapa_marcadores)
+
+    # Perfil de arranque: la última configuración buena de la cámara se reaplica sin volver a negociarla
+    perfil = PerfilCamara.cargar(ruta_perfil_camara) if ruta_perfil_camara else None
+    if perfil is not None and not perfil.compatible(video_source, ruta_calibracion):
+        perfil = None
+    ruta_tabla_perfil = os.path.splitext(ruta_perfil_camara)[0] + "_tabla.npy" if ruta_perfil_camara else None
+
+    # Planificador: el nivel de calidad inicial (el último bueno, si hay perfil) se aplica antes de capturar
+    planificador = None
+    if planificador_activo:
+        nivel_inicial = perfil.nivel_planificador if perfil is not None and perfil.nivel_planificador is not None else 1
+        # La focal sólo se puede escalar entre resoluciones con la misma relación de aspecto que la calibración
+        niveles = [nivel for nivel in NIVELES_POR_DEFECTO if detector_qr.calibracion.admite(nivel.resolucion)]
+        planificador = PlanificadorLatencia(niveles, presupuesto=presupuesto_latencia,
+                                            frecuencia_minima=frecuencia_minima_pose,
+                                            nivel_inicial=nivel_inicial, instrumentacion=instrumentacion)
+
+    # Inicializar captura de video de la cámara. Si con el perfil no llega ningún fotograma (otra cámara u
+    # otro driver), se descarta y se vuelve a abrir negociando desde cero
+    for intento in ((perfil, None) if perfil is not None else (None,)):
+        cap, captura = abrir_camara(intento, instrumentacion)
+        backend_video = nombre_backend(cap)
+        if planificador is not None:
+            nivel = planificador.nivel
+            # Con el perfil la cámara ya está en la resolución y el formato del nivel; volver a pedirlos
+            # haría que el driver renegociara
+            if intento is None or (intento.resolucion, intento.fourcc) != (nivel.resolucion, nivel.fourcc):
+                captura.reconfigurar(nivel.resolucion, nivel.fourcc)
+            detector_qr.ajustar_escalas(nivel.escalas_decodificacion)
+
+        # Arrancar el hilo de captura (sólo se conserva el fotograma más reciente)
+        captura.iniciar()
+
+        # Obtener dimensiones de la cámara
+        capturado, _ = captura.leer(timeout=2.0 if intento is not None else 5.0)
+        if capturado is not None:
+            break
+        captura.detener()
+        cap.release()
+        perfil = None
+    if capturado is None:
+        raise SystemExit(f"No se pudo leer ningún fotograma de la cámara {video_source}")
+    altura, ancho, _ = capturado.frame.shape
+    tiempo_primer_fotograma = segundos_desde_inicio()
+
+    # Las tablas de corrección de la distorsión: la de la resolución actual se lee del perfil o se calcula
+    # antes del bucle; las de las resoluciones a las que puede cambiar el planificador, en segundo plano
+    tabla_en_perfil = False
+    if detector_qr.calibracion is not None:
+        tabla_en_perfil = perfil is not None and detector_qr.calibracion.cargar_tabla((ancho, altura), ruta_tabla_perfil)
+        detector_qr.calibracion.preparar((ancho, altura))
+        if planificador is not None:
+            threading.Thread(target=lambda: [detector_qr.calibracion.preparar(nivel.resolucion)
+                                             for nivel in planificador.niveles],
+                             name='TablasCalibracion', daemon=True).start()
+
+    # Pool de procesos de decodificación (los fotogramas viajan por memoria compartida)
+    pool_decodificacion = None
+    if procesos_decodificacion > 0:
+        from pool_decodificacion import PoolDecodificacion
+        # Los huecos se dimensionan para la mayor resolución que puede pedir el planificador
+        forma_huecos = capturado.frame.shape
+        if planificador is not None:
+            forma_huecos = tuple(max(a, b) for a, b in zip(forma_huecos, planificador.forma_maxima(forma_huecos[2])))
+        pool_decodificacion = PoolDecodificacion(
+            forma_huecos, procesos_decodificacion,
+            opciones_detector=dict(longitud_focal=longitud_focal, distancia_maxima=distancia_maxima,
+                                   modo_seguimiento=modo_seguimiento, reacquisicion_cada=reacquisicion_cada,
+                                   usar_gris=usar_gris, escalas_decodificacion=escalas_decodificacion,
+                                   angulo_de_vision=angulo_de_vision, filtro_nitidez=filtro_nitidez,
+                                   resolucion_referencia=resolucion_referencia),
+            backend=backend_marcadores, opciones_backend=opciones_backend, ruta_mapa=ruta_mapa_marcadores,
+            ruta_calibracion=ruta_calibracion)
+
+    # Bucle Principal (Procesamiento de Video)
+    ultima_vista_previa = 0.0
+    ultima_deteccion = None  # Marca de tiempo del último fotograma con pose
+    perfil_nuevo = None  # Perfil de la cámara con la que se ha obtenido la primera pose
+    hilo_perfil = None
+    try:
+        while True:
+            capturado, descartados = captura.leer()
+            if planificador is not None and descartados:
+                planificador.contar_descartados(descartados)
+            mostrar = not modo_sin_pantalla or (
+                vista_previa_cada > 0 and time.monotonic() - ultima_vista_previa >= vista_previa_cada)
+            if capturado is not None and grabador is not None:
+                grabador.grabar(capturado)
+            # Sólo se anota para la vista previa remota cuando alguien la mira y toca enviar un fotograma
+            transmitir = servidor_vista is not None and servidor_vista.toca()
+            anotar = mostrar or (transmitir and vista_previa_anotada)
+
+            escalas = planificador.nivel.escalas_decodificacion if planificador is not None else None
+
+            # Resultados del fotograma actual o, con el pool, de los fotogramas ya decodificados en orden
+            if pool_decodificacion is not None:
+                if capturado is not None and not pool_decodificacion.enviar(capturado, anotar, escalas):
+                    instrumentacion.contar('frames_descartados_pool')
+                    if planificador is not None:
+                        planificador.contar_descartados()
+                resultados = ((r, r.frame, r.objetos_decodificados, r.coordenadas_dron, r.calidad, r.orientacion)
+                              for r in pool_decodificacion.resultados())
+                tiempos_fotograma = None  # Los trabajadores no llevan instrumentación: con el pool no hay tiempos por etapa
+            elif capturado is not None:
+                # La velocidad del estimador coloca la ventana de búsqueda donde se espera el QR
+                if estimador is not None and ultima_deteccion is not None:
+                    detector_qr.aplicar_pista(estimador.desplazamiento(ultima_deteccion, capturado.marca_tiempo))
+                with instrumentacion.medir('total_deteccion'):
+                    objetos_decodificados, frame_anotado, coordenadas_dron, calidad = detector_qr.encontrar_codigos_qr(
+                        capturado.frame, anotar)
+                orientacion = detector_qr.ultima_orientacion if coordenadas_dron else None
+                tiempos_fotograma = instrumentacion.nuevo_fotograma()
+                resultados = [(capturado, frame_anotado, objetos_decodificados, coordenadas_dron, calidad, orientacion)]
+            else:
+                resultados = []
+
+            for origen, frame_anotado, objetos_decodificados, coordenadas_dron, calidad, orientacion in resultados:
+                resumen_periodico.tick()
+
+                # El planificador mide la latencia desde la captura y cambia de nivel si hace falta
+                if planificador is not None:
+                    nivel = planificador.registrar(origen.marca_tiempo)
+                    if nivel is not None:
+                        captura.reconfigurar(nivel.resolucion, nivel.fourcc)
+                        detector_qr.ajustar_escalas(nivel.escalas_decodificacion)
+
+                # Primera pose: se informa del tiempo de arranque y se guarda la configuración como buena
+                if coordenadas_dron and perfil_nuevo is None:
+                    resumen_periodico.emitir({'arranque': {
+                        'primer_fotograma_s': round(tiempo_primer_fotograma, 3),
+                        'primera_pose_s': round(segundos_desde_inicio(), 3), 'perfil': perfil is not None}})
+                    perfil_nuevo = PerfilCamara.desde_estado(
+                        video_source, backend_video, frame_anotado.shape,
+                        planificador.nivel.fourcc if planificador is not None else (perfil.fourcc if perfil else None),
+                        planificador.indice if planificador is not None else None, ruta_calibracion, perfil)
+                    if ruta_perfil_camara:
+                        hilo_perfil = threading.Thread(
+                            target=guardar_perfil, name='GuardarPerfil', daemon=True,
+                            args=(perfil_nuevo, detector_qr.calibracion, (ancho, altura),
+                                  None if tabla_en_perfil else ruta_tabla_perfil))
+                        hilo_perfil.start()
+
+                if estimador is not None and coordenadas_dron:
+                    estimador.actualizar(coordenadas_dron, origen.marca_tiempo, calidad, orientacion)
+                    ultima_deteccion = origen.marca_tiempo
+                if registro_vuelo is not None:
+                    registro_vuelo.anotar(origen, frame_anotado.shape, objetos_decodificados, coordenadas_dron, calidad,
+                                          orientacion, tiempos_fotograma)
+                if salida_fija is None and publicador_pose is not None and coordenadas_dron:
+                    publicador_pose.publicar(registro_pose(origen, coordenadas_dron, len(objetos_decodificados),
+                                                           calidad, orientacion))
+
+                if anotar:
+                    dimensiones_camara = f"Dimensiones de la cámara: {frame_anotado.shape[1]}x{frame_anotado.shape[0]}"
+                    lineas_estado = [nombre_script, dimensiones_camara, f"Descartados: {captura.frames_descartados}"]
+                    if planificador is not None:
+                        lineas_estado.append(f"Nivel de calidad: {planificador.indice} ({planificador.nivel.fourcc}, "
+                                             f"escalas {planificador.nivel.escalas_decodificacion})")
+                    if pool_decodificacion is None and detector_qr.filtro_nitidez is not None:
+                        lineas_estado.append(f"Omitidos por nitidez: {detector_qr.filtro_nitidez.omitidos}")
+                    resumen = resumen_periodico.ultimo_resumen if panel_estadisticas else None
+                    if vista_rectificada and calibracion is not None:
+                        frame_anotado = calibracion.rectificar(frame_anotado)
+                    mostrar_frame(frame_anotado, coordenadas_dron, calidad, lineas_estado, resumen, instrumentacion,
+                                  ventana=mostrar)
+                if mostrar:
+                    ultima_vista_previa = time.monotonic()
+                if transmitir:
+                    servidor_vista.ofrecer(frame_anotado)
+
+            # En modo sin pantalla sólo hay ventana (y teclado) cuando se muestra una vista previa
+            if mostrar:
+                with instrumentacion.medir('waitKey'):
+                    key = cv2.waitKey(1) & 0xFF
+                if key == ord('q'):
+                    break
+    except KeyboardInterrupt:
+        pass
+
+    captura.detener()
+    if perfil_nuevo is not None and ruta_perfil_camara:
+        # Con el hilo de captura parado ya se puede preguntar a la cámara por el enfoque y el formato
+        if hilo_perfil is not None:
+            hilo_perfil.join()
+        if planificador is not None:
+            perfil_nuevo.nivel_planificador = planificador.indice
+        perfil_nuevo.actualizar_desde_captura(cap).guardar(ruta_perfil_camara)
+    cap.release()
+    if pool_decodificacion is not None:
+        pool_decodificacion.cerrar()
+    if salida_fija is not None:
+        salida_fija.detener()
+    if publicador_pose is not None:
+        publicador_pose.cerrar()
+    if enlace_serie is not None:
+        # Sin instrumentación el enlace mide con la suya propia: su balance sale siempre al cerrar
+        resumen_periodico.emitir({'enlace_serie': enlace_serie.estadisticas()})
+    if servidor_vista is not None:
+        servidor_vista.cerrar()
+    if grabador is not None:
+        grabador.cerrar()
+    if registro_vuelo is not None:
+        registro_vuelo.cerrar()
+    resumen_periodico.cerrar()
+    if not modo_sin_pantalla or vista_previa_cada > 0:
+        cv2.destroyAllWindows()
+
+if __name__ == "__main__":
+    main()
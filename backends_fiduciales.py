@@ -0,0 +1,137 @@
+# ######################################################################################################
+#                                     Proyecto de Localización de Drones
+# Módulo de backends de marcadores fiduciales
+#
+# Descripción:
+# Define una interfaz común para los distintos detectores de marcadores: pyzbar (QR), el detector de QR de
+# OpenCV (cv2.QRCodeDetector) y los marcadores cuadrados ArUco/AprilTag de cv2.aruco. Todos devuelven la
+# misma estructura de detección (esquinas, contenido o ID y confianza), de forma que DetectorQR puede usar
+# cualquiera de ellos. Los marcadores cuadrados se decodifican mucho más rápido que un QR completo en una
+# Raspberry Pi; el backend se elige en cada despliegue según el rendimiento medido.
+# ######################################################################################################
+
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+# Mismos nombres de campos que pyzbar, para que el resto del código no dependa del backend
+Point = namedtuple('Point', ['x', 'y'])
+Rect = namedtuple('Rect', ['left', 'top', 'width', 'height'])
+Deteccion = namedtuple('Deteccion', ['data', 'type', 'rect', 'polygon', 'confianza'])
+
+DICCIONARIO_ARUCO_POR_DEFECTO = 'DICT_4X4_50'
+
+
+def deteccion_desde_esquinas(data, tipo, esquinas, confianza=1.0):
+    """
+    Función para construir una Deteccion a partir de las cuatro esquinas de un marcador.
+    """
+    esquinas = np.asarray(esquinas, dtype=np.float32).reshape(-1, 2)
+    x0, y0 = np.floor(esquinas.min(axis=0)).astype(int)
+    x1, y1 = np.ceil(esquinas.max(axis=0)).astype(int)
+    polygon = [Point(float(x), float(y)) for x, y in esquinas]
+    return Deteccion(data, tipo, Rect(int(x0), int(y0), int(x1 - x0), int(y1 - y0)), polygon, confianza)
+
+
+def diccionario_aruco(nombre=DICCIONARIO_ARUCO_POR_DEFECTO):
+    """
+    Función para obtener un diccionario predefinido de cv2.aruco por su nombre (p. ej. 'DICT_APRILTAG_36h11').
+    """
+    return cv2.aruco.getPredefinedDictionary(getattr(cv2.aruco, nombre))
+
+
+def generar_imagen_aruco(id_marcador, lado_px, nombre_diccionario=DICCIONARIO_ARUCO_POR_DEFECTO, borde_px=0):
+    """
+    Función para dibujar un marcador ArUco/AprilTag como imagen en escala de grises, con un margen blanco opcional.
+    """
+    diccionario = diccionario_aruco(nombre_diccionario)
+    if hasattr(cv2.aruco, 'generateImageMarker'):
+        imagen = cv2.aruco.generateImageMarker(diccionario, id_marcador, lado_px)
+    else:
+        imagen = cv2.aruco.drawMarker(diccionario, id_marcador, lado_px)
+    if borde_px:
+        imagen = cv2.copyMakeBorder(imagen, borde_px, borde_px, borde_px, borde_px, cv2.BORDER_CONSTANT, value=255)
+    return imagen
+
+
+class BackendFiducial:
+    """
+    Clase base de los backends: `detectar` recibe una imagen y devuelve una lista de Deteccion.
+    """
+    nombre = None
+
+    def detectar(self, imagen):
+        raise NotImplementedError
+
+
+class BackendPyzbar(BackendFiducial):
+    """
+    Backend que decodifica QR con pyzbar (zbar).
+    """
+    nombre = 'pyzbar'
+
+    def __init__(self):
+        from pyzbar import pyzbar
+        self._pyzbar = pyzbar
+
+    def detectar(self, imagen):
+        return [Deteccion(obj.data, obj.type, Rect(*obj.rect), [Point(*p) for p in obj.polygon], 1.0)
+                for obj in self._pyzbar.decode(imagen)]
+
+
+class BackendQROpenCV(BackendFiducial):
+    """
+    Backend que decodifica QR con cv2.QRCodeDetector (varios QR por imagen).
+    """
+    nombre = 'opencv_qr'
+
+    def __init__(self):
+        self._detector = cv2.QRCodeDetector()
+
+    def detectar(self, imagen):
+        ok, textos, puntos, _ = self._detector.detectAndDecodeMulti(imagen)
+        if not ok or puntos is None:
+            return []
+        # Los QR localizados pero no decodificados llegan con el texto vacío y se descartan
+        return [deteccion_desde_esquinas(texto.encode('utf-8'), 'QRCODE', esquinas)
+                for texto, esquinas in zip(textos, puntos) if texto]
+
+
+class BackendAruco(BackendFiducial):
+    """
+    Backend que detecta marcadores cuadrados ArUco/AprilTag con cv2.aruco. El contenido es el ID del marcador.
+    """
+    nombre = 'aruco'
+
+    def __init__(self, nombre_diccionario=DICCIONARIO_ARUCO_POR_DEFECTO):
+        self.nombre_diccionario = nombre_diccionario
+        diccionario = diccionario_aruco(nombre_diccionario)
+        parametros = cv2.aruco.DetectorParameters()
+        if hasattr(cv2.aruco, 'ArucoDetector'):
+            detector = cv2.aruco.ArucoDetector(diccionario, parametros)
+            self._detectar_marcadores = detector.detectMarkers
+        else:
+            self._detectar_marcadores = lambda imagen: cv2.aruco.detectMarkers(imagen, diccionario,
+                                                                               parameters=parametros)
+
+    def detectar(self, imagen):
+        esquinas, ids, _ = self._detectar_marcadores(imagen)
+        if ids is None:
+            return []
+        return [deteccion_desde_esquinas(str(int(id_marcador)).encode('utf-8'), 'ARUCO', esquinas_marcador)
+                for esquinas_marcador, id_marcador in zip(esquinas, ids.flatten())]
+
+
+BACKENDS = {backend.nombre: backend for backend in (BackendPyzbar, BackendQROpenCV, BackendAruco)}
+
+
+def crear_backend(nombre='pyzbar', **opciones):
+    """
+    Función para crear un backend a partir de su nombre ('pyzbar', 'opencv_qr' o 'aruco').
+    """
+    try:
+        clase = BACKENDS[nombre]
+    except KeyError:
+        raise ValueError(f"Backend de marcadores desconocido: {nombre}") from None
+    return clase(**opciones)
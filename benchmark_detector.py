@@ -0,0 +1,228 @@
+# ######################################################################################################
+#                                     Proyecto de Localización de Drones
+# Banco de pruebas de DetectorQR
+#
+# Descripción:
+# Pasa fotogramas por DetectorQR.encontrar_codigos_qr tan rápido como sea posible y mide el rendimiento:
+# fotogramas por segundo, percentiles de latencia por fotograma y tasa de detección. Los fotogramas pueden
+# venir de una grabación hecha con `grabacion.py` o generarse de forma sintética renderizando los propios
+# códigos del proyecto con distinta escala, rotación y desenfoque, así que no hace falta cámara.
+#
+# Uso:
+#   python benchmark_detector.py --sinteticos 300 --backend opencv_qr --escalas 0.5,1.0 --seguimiento
+#   python benchmark_detector.py --grabacion vuelo_01
+#   python benchmark_detector.py --comprobar-pose
+# ######################################################################################################
+
+import argparse
+import json
+import math
+import time
+
+import cv2
+import numpy as np
+import qrcode
+
+from backends_fiduciales import crear_backend, generar_imagen_aruco
+from captura import FrameCapturado
+from detector_qr import DetectorQR
+from grabacion import leer_grabacion
+from instrumentacion import Instrumentacion
+from mapa_marcadores import MapaMarcadores
+
+CONTENIDO_SINTETICO = '6,1,2'  # Mismo formato "lado,x,y" que genera QRgen1.py
+ID_SINTETICO = 7
+
+
+def imagen_marcador(backend, lado_px=180):
+    """
+    Función para renderizar el marcador del proyecto que corresponde al backend, con su zona de silencio.
+    """
+    if backend == 'aruco':
+        return generar_imagen_aruco(ID_SINTETICO, lado_px, borde_px=lado_px // 5)
+
+    qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_L, box_size=10, border=4)
+    qr.add_data(CONTENIDO_SINTETICO)
+    qr.make(fit=True)
+    imagen = np.array(qr.make_image(fill_color="black", back_color="white").convert('L'))
+    return cv2.resize(imagen, (lado_px, lado_px), interpolation=cv2.INTER_NEAREST)
+
+
+def generar_frames_sinteticos(num_frames, backend='pyzbar', resolucion=(640, 480), semilla=0):
+    """
+    Función generadora de fotogramas sintéticos: el marcador sigue una trayectoria suave por la imagen
+    mientras cambian su escala y su rotación, con desenfoque y ruido aleatorios.
+    """
+    rng = np.random.default_rng(semilla)
+    ancho, alto = resolucion
+    marcador = imagen_marcador(backend)
+    lado = marcador.shape[0]
+    fondo = np.full((alto, ancho), 190, dtype=np.uint8)
+
+    for i in range(num_frames):
+        fase = 2 * math.pi * i / max(num_frames, 1)
+        escala = 0.9 + 0.4 * math.sin(3 * fase)
+        angulo = 30 * math.sin(2 * fase)
+        centro = (ancho / 2 + ancho / 5 * math.cos(fase), alto / 2 + alto / 8 * math.sin(fase))
+
+        matriz = cv2.getRotationMatrix2D((lado / 2, lado / 2), angulo, escala)
+        matriz[:, 2] += np.array(centro) - lado / 2
+        frame = cv2.warpAffine(marcador, matriz, (ancho, alto), borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+        mascara = cv2.warpAffine(np.full_like(marcador, 255), matriz, (ancho, alto))
+        frame = np.where(mascara > 0, frame, fondo)
+
+        sigma = rng.uniform(0, 1.5)
+        if sigma > 0.3:
+            frame = cv2.GaussianBlur(frame, (0, 0), sigma)
+        ruido = rng.normal(0, 4, frame.shape)
+        frame = np.clip(frame + ruido, 0, 255).astype(np.uint8)
+        yield FrameCapturado(cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR), i / 30.0, i + 1)
+
+
+def ejecutar_benchmark(detector, frames, contenido_esperado=None):
+    """
+    Función para pasar todos los fotogramas por el detector y calcular las estadísticas de rendimiento.
+    Sólo se mide encontrar_codigos_qr; la lectura o generación de los fotogramas queda fuera.
+    """
+    latencias = []
+    tiempo_cpu = 0.0
+    detectados = 0
+    con_pose = 0
+    for capturado in frames:
+        frame = capturado.frame.copy()
+        inicio_cpu = time.process_time()
+        inicio = time.perf_counter()
+        objetos, _, coordenadas_dron, _ = detector.encontrar_codigos_qr(frame, dibujar=False)
+        latencias.append(time.perf_counter() - inicio)
+        tiempo_cpu += time.process_time() - inicio_cpu
+
+        if contenido_esperado is None:
+            detectados += bool(objetos)
+        else:
+            detectados += any(obj.data == contenido_esperado for obj in objetos)
+        con_pose += coordenadas_dron is not None
+
+    if not latencias:
+        return {'frames': 0}
+    latencias_ms = np.array(latencias) * 1000
+    p50, p95, p99 = np.percentile(latencias_ms, [50, 95, 99])
+    return {
+        'frames': len(latencias),
+        'fps': len(latencias) / (latencias_ms.sum() / 1000),
+        'latencia_media_ms': float(latencias_ms.mean()),
+        'latencia_p50_ms': float(p50),
+        'latencia_p95_ms': float(p95),
+        'latencia_p99_ms': float(p99),
+        'tasa_deteccion': detectados / len(latencias),
+        'tasa_pose': con_pose / len(latencias),
+        # Poses útiles por segundo de CPU: lo que importa en la Raspberry Pi
+        'poses_por_segundo_cpu': con_pose / tiempo_cpu if tiempo_cpu > 0 else 0.0,
+        'omitidos_nitidez': detector.filtro_nitidez.omitidos if detector.filtro_nitidez is not None else 0,
+    }
+
+
+def comprobar_pose_frontal(detector, resolucion=(640, 480)):
+    """
+    Función para comprobar la pose de un marcador visto exactamente de frente, el caso en que IPPE degenera.
+    Gira el cuadrado en la imagen a pasos de 7° con varios tamaños y centros y exige que todas las poses sean
+    válidas, finitas y a la altura y distancia horizontal que da el modelo pinhole.
+    Devuelve la lista de fallos como (ángulo, lado en px, centro, posición).
+    """
+    ancho, alto = resolucion
+    if detector.calibracion is None:
+        detector.calibracion = detector.calibracion_ideal(resolucion)
+    matriz_camara, _ = detector.calibracion.preparar(resolucion)
+    lado_m = 0.1
+    fallos = []
+    for angulo in np.arange(0.0, 360.0, 7.0):
+        coseno, seno = math.cos(math.radians(angulo)), math.sin(math.radians(angulo))
+        giro = np.array([[coseno, -seno], [seno, coseno]])
+        for semilado_px in (30, 60, 100, 150):
+            for centro in ((ancho / 2, alto / 2), (ancho / 2 + 1.5, alto / 2 - 1), (ancho * 0.3, alto * 0.6)):
+                cuadrado = np.array([[-1, -1], [1, -1], [1, 1], [-1, 1]]) * semilado_px
+                esquinas = (cuadrado @ giro.T + centro)[None]
+                posiciones, _, _, _, validas = detector.calcular_posiciones(
+                    esquinas, np.array([2.0 * semilado_px]), np.array([[lado_m * 100, 0.0, 0.0]]), (alto, ancho, 3))
+                posicion = posiciones[0]
+                altura = lado_m * matriz_camara[0, 0] / (2 * semilado_px)
+                # Vista de frente: la cámara está a la altura del modelo pinhole y, en horizontal, a la distancia
+                # que separa el centro del marcador del punto principal (la dirección depende del giro)
+                horizontal = np.hypot((centro[0] - matriz_camara[0, 2]) / matriz_camara[0, 0],
+                                      (centro[1] - matriz_camara[1, 2]) / matriz_camara[1, 1]) * altura
+                if (not validas[0] or not np.isfinite(posicion).all() or abs(posicion[2] - altura) > 0.005
+                        or abs(np.hypot(posicion[0], posicion[1]) - horizontal) > 0.005):
+                    fallos.append((float(angulo), 2 * semilado_px, centro, posicion))
+    return fallos
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Banco de pruebas de DetectorQR')
+    origen = parser.add_mutually_exclusive_group()
+    origen.add_argument('--grabacion', help='Carpeta de una grabación hecha con grabacion.py')
+    origen.add_argument('--sinteticos', type=int, default=300, help='Número de fotogramas sintéticos')
+    parser.add_argument('--backend', default='pyzbar', choices=['pyzbar', 'opencv_qr', 'aruco'])
+    parser.add_argument('--escalas', default='1.0', help='Niveles de la pirámide, p. ej. 0.5,1.0')
+    parser.add_argument('--seguimiento', action='store_true', help='Activar el modo seguimiento (ROI)')
+    parser.add_argument('--nitidez', action='store_true', help='Omitir los fotogramas movidos antes de decodificar')
+    parser.add_argument('--resolucion', default='640x480', help='Resolución de los fotogramas sintéticos')
+    parser.add_argument('--mapa', help='Mapa de marcadores para los códigos que sólo llevan un ID')
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--etapas', action='store_true', help='Medir también cada etapa del detector')
+    parser.add_argument('--json', action='store_true', help='Mostrar el resultado como JSON')
+    parser.add_argument('--comprobar-pose', action='store_true',
+                        help='Comprobar la pose de un marcador girado visto de frente y salir')
+    args = parser.parse_args()
+
+    mapa = MapaMarcadores.cargar(args.mapa) if args.mapa else MapaMarcadores()
+    ancho, alto = (int(v) for v in args.resolucion.lower().split('x'))
+    if args.comprobar_pose:
+        frames, contenido_esperado = [], None
+    elif args.grabacion:
+        frames = leer_grabacion(args.grabacion)
+        contenido_esperado = None
+    else:
+        # Se generan antes de medir para que el renderizado no cuente en la latencia
+        frames = list(generar_frames_sinteticos(args.sinteticos, args.backend, (ancho, alto), args.semilla))
+        if args.backend == 'aruco':
+            mapa.agregar(ID_SINTETICO, 6, 1, 2)
+            contenido_esperado = str(ID_SINTETICO).encode('utf-8')
+        else:
+            contenido_esperado = CONTENIDO_SINTETICO.encode('utf-8')
+
+    instrumentacion = Instrumentacion(activa=args.etapas, ventana=max(args.sinteticos, 10000))
+    detector = DetectorQR(850.0, 200.0, modo_seguimiento=args.seguimiento,
+                          escalas_decodificacion=[float(v) for v in args.escalas.split(',')],
+                          dibujar=False, backend=crear_backend(args.backend), mapa=mapa,
+                          instrumentacion=instrumentacion, filtro_nitidez=args.nitidez)
+    if args.comprobar_pose:
+        fallos = comprobar_pose_frontal(detector, (ancho, alto))
+        for angulo, lado_px, centro, posicion in fallos:
+            print(f"Pose incorrecta: giro {angulo:.0f}°, lado {lado_px} px, centro {centro} -> {posicion}")
+        print(f"Pose de frente: {len(fallos)} fallos")
+        raise SystemExit(1 if fallos else 0)
+    resultado = ejecutar_benchmark(detector, frames, contenido_esperado)
+    if args.etapas:
+        resultado['etapas'] = instrumentacion.resumen()['etapas']
+
+    if args.json:
+        print(json.dumps(resultado))
+        return
+    if not resultado['frames']:
+        print("No hay fotogramas que procesar.")
+        return
+    print(f"Fotogramas:        {resultado['frames']}")
+    print(f"Rendimiento:       {resultado['fps']:.1f} fps")
+    print(f"Latencia p50/p95/p99: {resultado['latencia_p50_ms']:.2f} / {resultado['latencia_p95_ms']:.2f} / "
+          f"{resultado['latencia_p99_ms']:.2f} ms")
+    print(f"Tasa de detección: {resultado['tasa_deteccion'] * 100:.1f} %")
+    print(f"Tasa de pose:      {resultado['tasa_pose'] * 100:.1f} %")
+    print(f"Poses/s de CPU:    {resultado['poses_por_segundo_cpu']:.1f}")
+    if args.nitidez:
+        print(f"Omitidos por nitidez: {resultado['omitidos_nitidez']}")
+    for etapa, datos in resultado.get('etapas', {}).items():
+        print(f"  {etapa}: p50 {datos['p50_ms']:.2f} / p95 {datos['p95_ms']:.2f} / p99 {datos['p99_ms']:.2f} ms "
+              f"({datos['n']} muestras)")
+
+
+if __name__ == "__main__":
+    main()
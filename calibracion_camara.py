@@ -0,0 +1,263 @@
+# ######################################################################################################
+#                                     Proyecto de Localización de Drones
+# Módulo de calibración de la cámara
+#
+# Descripción:
+# Guarda y carga los parámetros intrínsecos (matriz de cámara) y los coeficientes de distorsión de la
+# cámara, y prepara una sola vez por resolución las tablas de corrección. En cada fotograma sólo se
+# corrigen las esquinas de los marcadores detectados, con una búsqueda en la tabla, en lugar de rectificar
+# la imagen completa. Las tablas de cv2.initUndistortRectifyMap sólo se construyen si se pide la vista
+# previa rectificada.
+#
+# Calibración con un tablero de ajedrez (9x6 esquinas interiores, cuadros de 2.5 cm):
+#   python calibracion_camara.py --camara 0 --tablero 9x6 --cuadro 2.5 --capturas 20
+#   python calibracion_camara.py --imagenes vuelo_calibracion --tablero 9x6 --cuadro 2.5
+# ######################################################################################################
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from grabacion import leer_grabacion
+
+RUTA_CALIBRACION = 'calibracion_camara.json'
+
+
+class CalibracionCamara:
+    """
+    Clase con la matriz de cámara y la distorsión para una resolución, y sus tablas de corrección.
+    """
+    def __init__(self, matriz_camara, distorsion=None, resolucion=None, error_reproyeccion=None):
+        self.matriz_camara = np.asarray(matriz_camara, dtype=np.float64).reshape(3, 3)
+        self.distorsion = np.zeros(5) if distorsion is None else np.asarray(distorsion, dtype=np.float64).ravel()
+        self.resolucion = tuple(resolucion) if resolucion is not None else None  # (ancho, alto)
+        self.error_reproyeccion = error_reproyeccion
+        self._tablas = {}  # (ancho, alto) -> (matriz, tabla de puntos o None)
+        self._mapas_rectificacion = {}  # (ancho, alto) -> (mapa_x, mapa_y)
+
+    @classmethod
+    def desde_longitud_focal(cls, longitud_focal, resolucion):
+        """
+        Función para crear una calibración ideal (sin distorsión y con el centro óptico en el centro de la
+        imagen) a partir de la longitud focal en píxeles a la `resolucion` (ancho, alto) indicada, cuando no
+        hay fichero de calibración. En otras resoluciones la focal se escala como la imagen.
+        """
+        ancho, alto = resolucion
+        return cls([[longitud_focal, 0, ancho / 2], [0, longitud_focal, alto / 2], [0, 0, 1]], resolucion=resolucion)
+
+    @classmethod
+    def desde_angulo_de_vision(cls, angulo_de_vision, resolucion):
+        """
+        Función para crear una calibración ideal a partir del ángulo de visión vertical (en radianes).
+        """
+        return cls.desde_longitud_focal((resolucion[1] / 2) / np.tan(angulo_de_vision / 2), resolucion)
+
+    @classmethod
+    def cargar(cls, ruta=RUTA_CALIBRACION):
+        """
+        Función para leer una calibración guardada con `guardar`. Devuelve None si el fichero no existe.
+        """
+        if not ruta or not os.path.exists(ruta):
+            return None
+        with open(ruta, encoding='utf-8') as fichero:
+            datos = json.load(fichero)
+        return cls(datos['matriz_camara'], datos['distorsion'], datos.get('resolucion'),
+                   datos.get('error_reproyeccion'))
+
+    def guardar(self, ruta=RUTA_CALIBRACION):
+        with open(ruta, 'w', encoding='utf-8') as fichero:
+            json.dump({'matriz_camara': self.matriz_camara.tolist(), 'distorsion': self.distorsion.tolist(),
+                       'resolucion': list(self.resolucion) if self.resolucion else None,
+                       'error_reproyeccion': self.error_reproyeccion}, fichero, indent=2)
+
+    def tiene_distorsion(self):
+        return bool(np.any(self.distorsion))
+
+    def admite(self, resolucion):
+        """
+        Función que dice si la calibración vale para otra resolución: sólo si tiene la misma relación de
+        aspecto. Un modo con otra relación recorta el sensor de otra manera y la focal no se puede escalar.
+        """
+        if self.resolucion is None:
+            return True
+        return abs(resolucion[0] / resolucion[1] - self.resolucion[0] / self.resolucion[1]) < 0.01
+
+    def matriz_para(self, resolucion):
+        """
+        Función que devuelve la matriz de cámara para otra resolución (misma relación de aspecto).
+        Sin resolución calibrada, el centro óptico se coloca en el centro de la imagen. Con otra relación de
+        aspecto no se estira la matriz: se avisa y se supone un recorte centrado del modo calibrado.
+        """
+        ancho, alto = resolucion
+        matriz = self.matriz_camara.copy()
+        if self.resolucion is None:
+            matriz[0, 2], matriz[1, 2] = ancho / 2, alto / 2
+        elif not self.admite(resolucion):
+            # Escalar fx y fy por factores distintos daría píxeles no cuadrados. Se usa una sola escala, la
+            # mayor, que es la de un modo que llena el sensor en un eje y lo recorta en el otro
+            escala = max(ancho / self.resolucion[0], alto / self.resolucion[1])
+            print(f"Calibración: {ancho}x{alto} no tiene la relación de aspecto de la calibración "
+                  f"({self.resolucion[0]}x{self.resolucion[1]}); se supone un recorte centrado. "
+                  f"Calibra la cámara en este modo para una pose exacta.", file=sys.stderr)
+            matriz[0:2, 0:2] *= escala
+            matriz[0, 2] = (matriz[0, 2] - self.resolucion[0] / 2) * escala + ancho / 2
+            matriz[1, 2] = (matriz[1, 2] - self.resolucion[1] / 2) * escala + alto / 2
+        elif tuple(resolucion) != self.resolucion:
+            matriz[0] *= ancho / self.resolucion[0]
+            matriz[1] *= alto / self.resolucion[1]
+        return matriz
+
+    def preparar(self, resolucion):
+        """
+        Función para construir, una sola vez por resolución, la matriz de cámara y la tabla que da para cada
+        píxel de la imagen con distorsión su posición corregida (en píxeles de la misma matriz de cámara).
+        """
+        resolucion = tuple(int(v) for v in resolucion)
+        if resolucion not in self._tablas:
+            matriz = self.matriz_para(resolucion)
+            tabla = None
+            if self.tiene_distorsion():
+                ancho, alto = resolucion
+                rejilla = np.mgrid[0:alto, 0:ancho][::-1].transpose(1, 2, 0).reshape(-1, 1, 2).astype(np.float32)
+                tabla = cv2.undistortPoints(rejilla, matriz, self.distorsion, P=matriz).reshape(alto, ancho, 2)
+            self._tablas[resolucion] = (matriz, tabla)
+        return self._tablas[resolucion]
+
+    def guardar_tabla(self, resolucion, ruta):
+        """
+        Función para guardar la tabla de corrección de una resolución (.npy) y no tener que recalcularla
+        al volver a arrancar. Sin distorsión no hay tabla y no se guarda nada.
+        """
+        _, tabla = self.preparar(resolucion)
+        if tabla is not None:
+            np.save(ruta, tabla)
+
+    def cargar_tabla(self, resolucion, ruta):
+        """
+        Función para usar una tabla guardada con `guardar_tabla`. Devuelve False si no existe o no encaja.
+        """
+        resolucion = tuple(int(v) for v in resolucion)
+        if not self.tiene_distorsion() or not os.path.exists(ruta):
+            return False
+        tabla = np.load(ruta)
+        if tabla.shape != (resolucion[1], resolucion[0], 2):
+            return False
+        self._tablas[resolucion] = (self.matriz_para(resolucion), tabla)
+        return True
+
+    def corregir_puntos(self, puntos, resolucion):
+        """
+        Función para quitar la distorsión a un array de puntos (..., 2) por interpolación bilineal en la tabla.
+        """
+        _, tabla = self.preparar(resolucion)
+        puntos = np.asarray(puntos, dtype=np.float64)
+        if tabla is None:
+            return puntos
+        alto, ancho = tabla.shape[:2]
+        x = np.clip(puntos[..., 0], 0, ancho - 1.001)
+        y = np.clip(puntos[..., 1], 0, alto - 1.001)
+        x0, y0 = x.astype(np.intp), y.astype(np.intp)
+        fx, fy = (x - x0)[..., None], (y - y0)[..., None]
+        return ((tabla[y0, x0] * (1 - fx) + tabla[y0, x0 + 1] * fx) * (1 - fy)
+                + (tabla[y0 + 1, x0] * (1 - fx) + tabla[y0 + 1, x0 + 1] * fx) * fy)
+
+    def rectificar(self, frame):
+        """
+        Función para rectificar un fotograma completo (sólo para la vista previa) con mapas precalculados.
+        """
+        if not self.tiene_distorsion():
+            return frame
+        resolucion = (frame.shape[1], frame.shape[0])
+        if resolucion not in self._mapas_rectificacion:
+            matriz = self.matriz_para(resolucion)
+            self._mapas_rectificacion[resolucion] = cv2.initUndistortRectifyMap(
+                matriz, self.distorsion, None, matriz, resolucion, cv2.CV_16SC2)
+        mapa_x, mapa_y = self._mapas_rectificacion[resolucion]
+        return cv2.remap(frame, mapa_x, mapa_y, cv2.INTER_LINEAR)
+
+
+def calibrar_tablero(frames, tablero=(9, 6), lado_cuadro_cm=2.5):
+    """
+    Función para calibrar la cámara a partir de fotogramas de un tablero de ajedrez.
+    Devuelve la CalibracionCamara y el número de fotogramas en los que se encontró el tablero.
+    """
+    patron = np.zeros((tablero[0] * tablero[1], 3), np.float32)
+    patron[:, :2] = np.mgrid[0:tablero[0], 0:tablero[1]].T.reshape(-1, 2) * lado_cuadro_cm / 100
+    criterio = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
+
+    puntos_objeto, puntos_imagen, resolucion = [], [], None
+    for frame in frames:
+        gris = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        resolucion = (gris.shape[1], gris.shape[0])
+        encontrado, esquinas = cv2.findChessboardCorners(gris, tablero, None)
+        if not encontrado:
+            continue
+        puntos_objeto.append(patron)
+        puntos_imagen.append(cv2.cornerSubPix(gris, esquinas, (11, 11), (-1, -1), criterio))
+
+    if len(puntos_objeto) < 3:
+        return None, len(puntos_objeto)
+    error, matriz, distorsion, _, _ = cv2.calibrateCamera(puntos_objeto, puntos_imagen, resolucion, None, None)
+    return CalibracionCamara(matriz, distorsion, resolucion, float(error)), len(puntos_objeto)
+
+
+def capturar_tablero(fuente_video, capturas, tablero, intervalo=1.0, tiempo_maximo=120.0):
+    """
+    Función para tomar de la cámara `capturas` fotogramas con el tablero visible, separados al menos
+    `intervalo` segundos para que haya variedad de posiciones.
+    """
+    cap = cv2.VideoCapture(fuente_video)
+    frames = []
+    ultimo = 0.0
+    inicio = time.monotonic()
+    try:
+        while len(frames) < capturas and time.monotonic() - inicio < tiempo_maximo:
+            leido, frame = cap.read()
+            if not leido:
+                break
+            ahora = time.monotonic()
+            if ahora - ultimo < intervalo:
+                continue
+            gris = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            if cv2.findChessboardCorners(gris, tablero, None, cv2.CALIB_CB_FAST_CHECK)[0]:
+                frames.append(frame)
+                ultimo = ahora
+                print(f"Captura {len(frames)}/{capturas}")
+    finally:
+        cap.release()
+    return frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Calibración de la cámara con un tablero de ajedrez')
+    origen = parser.add_mutually_exclusive_group()
+    origen.add_argument('--camara', default='0', help='Cámara (índice de dispositivo o URL)')
+    origen.add_argument('--imagenes', help='Carpeta de una grabación hecha con grabacion.py')
+    parser.add_argument('--tablero', default='9x6', help='Esquinas interiores del tablero (columnas x filas)')
+    parser.add_argument('--cuadro', type=float, default=2.5, help='Lado de cada cuadro en cm')
+    parser.add_argument('--capturas', type=int, default=20, help='Fotogramas con el tablero a capturar')
+    parser.add_argument('--salida', default=RUTA_CALIBRACION, help='Fichero de calibración')
+    args = parser.parse_args()
+
+    tablero = tuple(int(v) for v in args.tablero.lower().split('x'))
+    if args.imagenes:
+        frames = [capturado.frame for capturado in leer_grabacion(args.imagenes)]
+    else:
+        fuente_video = int(args.camara) if args.camara.isdigit() else args.camara
+        frames = capturar_tablero(fuente_video, args.capturas, tablero)
+
+    calibracion, validos = calibrar_tablero(frames, tablero, args.cuadro)
+    if calibracion is None:
+        raise SystemExit(f"Tablero encontrado sólo en {validos} fotogramas; hacen falta al menos 3.")
+    calibracion.guardar(args.salida)
+    print(f"Calibración guardada en {args.salida} ({validos} fotogramas, "
+          f"error de reproyección {calibracion.error_reproyeccion:.3f} px)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+# ######################################################################################################
+#                                     Proyecto de Localización de Drones
+# Módulo del generador del campo de marcadores
+#
+# Descripción:
+# Genera sin interfaz gráfica todos los marcadores de la zona de vuelo a partir de una rejilla (extensión,
+# separación y lado) o de un mapa de marcadores ya existente. Los códigos se codifican en paralelo en un
+# pool de procesos y cada uno se dibuja en el PDF directamente desde memoria, sin ficheros temporales, con
+# varios marcadores por hoja A4 (A3 si no caben) y marcas de corte. Junto al PDF se escribe el mapa de marcadores que le
+# corresponde, así que el campo impreso y el mapa que carga `Visión UI.py` siempre coinciden.
+#
+# Uso:
+#   python campo_marcadores.py --extension 20x10 --separacion 2 --lado 18 --salida campo.pdf --salida-mapa mapa_marcadores.csv
+#   python campo_marcadores.py --mapa mapa_marcadores.csv --tipo ArUco --salida campo_aruco.pdf
+# ######################################################################################################
+
+import argparse
+import multiprocessing as mp
+import os
+import time
+
+import numpy as np
+import qrcode
+from PIL import Image
+from reportlab.lib.pagesizes import A3, A4, landscape
+from reportlab.lib.units import cm
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas
+
+from backends_fiduciales import DICCIONARIO_ARUCO_POR_DEFECTO, diccionario_aruco, generar_imagen_aruco
+from mapa_marcadores import MapaMarcadores
+
+MARGEN_HOJA_CM = 0.5  # Margen mínimo entre el borde de la hoja y la línea de corte
+HUECO_CM = 0.6  # Espacio entre marcadores vecinos para las marcas de corte y el rótulo
+LONGITUD_MARCA_CM = 0.3
+# Hojas que se prueban, de la preferida a la última opción: en cada tamaño, la orientación en la que caben más
+TAMAÑOS_HOJA = ((A4, landscape(A4)), (A3, landscape(A3)))
+
+
+def matriz_modulos(tipo, contenido, borde=0, nombre_diccionario=DICCIONARIO_ARUCO_POR_DEFECTO):
+    """
+    Función que codifica un marcador y devuelve su matriz de módulos (uint8, 0 negro y 255 blanco, un
+    píxel por módulo) con `borde` módulos de margen blanco. Para ArUco el contenido debe ser el ID.
+    """
+    if tipo == "ArUco":
+        modulos = diccionario_aruco(nombre_diccionario).markerSize + 2  # Con su borde negro
+        matriz = generar_imagen_aruco(int(contenido), modulos, nombre_diccionario)
+        return np.pad(matriz, borde, constant_values=255)
+    qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_L, border=borde)
+    qr.add_data(contenido)
+    qr.make(fit=True)
+    return np.where(np.array(qr.get_matrix(), dtype=bool), 0, 255).astype(np.uint8)
+
+
+def rectangulos_modulos(matriz):
+    """
+    Función que agrupa los módulos negros de la matriz en rectángulos (fila, columna, filas, columnas):
+    primero los tramos seguidos de cada fila y después los tramos iguales de filas consecutivas.
+    """
+    rectangulos = []
+    abiertos = {}  # (columna_inicio, columna_fin) -> fila en la que empezó el rectángulo
+    for fila, valores in enumerate(np.vstack([matriz == 0, np.zeros((1, matriz.shape[1]), dtype=bool)])):
+        bordes = np.flatnonzero(np.diff(np.concatenate(([0], valores.astype(np.int8), [0]))))
+        tramos = set(zip(bordes[::2].tolist(), bordes[1::2].tolist()))
+        for tramo in list(abiertos):
+            if tramo not in tramos:
+                inicio = abiertos.pop(tramo)
+                rectangulos.append((inicio, tramo[0], fila - inicio, tramo[1] - tramo[0]))
+        for tramo in tramos:
+            abiertos.setdefault(tramo, fila)
+    return rectangulos
+
+
+def dibujar_matriz_vectorial(c, matriz, x, y, lado):
+    """
+    Función para dibujar la matriz de módulos como un único trazado vectorial relleno de lado `lado`
+    puntos con la esquina inferior izquierda en (x, y). Los bordes quedan nítidos a cualquier tamaño.
+    """
+    modulo = lado / matriz.shape[0]
+    trazado = c.beginPath()
+    for fila, columna, filas, columnas in rectangulos_modulos(matriz):
+        trazado.rect(x + columna * modulo, y + lado - (fila + filas) * modulo, columnas * modulo, filas * modulo)
+    c.setFillColorRGB(0, 0, 0)
+    c.drawPath(trazado, stroke=0, fill=1)
+
+
+def _contexto_multiproceso():
+    # fork evita volver a importar el script en cada trabajador (en Linux)
+    metodos = mp.get_all_start_methods()
+    return mp.get_context('fork' if 'fork' in metodos else 'spawn')
+
+
+def _codificar(tarea):
+    # Se ejecuta en los procesos del pool: sólo viaja la matriz de módulos, que es muy pequeña
+    tipo, contenido, nombre_diccionario = tarea
+    return matriz_modulos(tipo, contenido, 0, nombre_diccionario)
+
+
+def mapa_rejilla(extension_m, separacion_m, lado_cm, origen_m=(0.0, 0.0)):
+    """
+    Función para crear el mapa de una rejilla de marcadores que cubre `extension_m` (ancho, alto) con
+    la separación dada, numerados por filas desde el ID 0.
+    """
+    xs = origen_m[0] + np.arange(0, extension_m[0] + 1e-9, separacion_m)
+    ys = origen_m[1] + np.arange(0, extension_m[1] + 1e-9, separacion_m)
+    mapa = MapaMarcadores()
+    for y in ys:
+        for x in xs:
+            mapa.agregar(mapa.siguiente_id(), lado_cm, round(float(x), 6), round(float(y), 6))
+    return mapa
+
+
+def disposicion_hoja(lado_corte_cm):
+    """
+    Función que elige la hoja para marcadores que una vez recortados (con su margen blanco) miden
+    `lado_corte_cm` y devuelve su tamaño, cuántas columnas y filas caben y la distancia entre marcadores.
+    Los vecinos comparten el hueco que los separa. Lanza ValueError si no caben ni en A3.
+    """
+    paso = (lado_corte_cm + HUECO_CM) * cm
+    for tamaños in TAMAÑOS_HOJA:
+        mejor = None
+        for tamaño_hoja in tamaños:
+            columnas = int((tamaño_hoja[0] - 2 * MARGEN_HOJA_CM * cm + HUECO_CM * cm) // paso)
+            filas = int((tamaño_hoja[1] - 2 * MARGEN_HOJA_CM * cm + HUECO_CM * cm) // paso)
+            if columnas * filas > 0 and (mejor is None or columnas * filas > mejor[1] * mejor[2]):
+                mejor = (tamaño_hoja, columnas, filas, paso)
+        if mejor is not None:
+            return mejor
+    raise ValueError(f"Un marcador de {lado_corte_cm:.1f} cm con su margen no cabe en una hoja A3")
+
+
+def dibujar_marcas_corte(c, x, y, lado):
+    """
+    Función para dibujar las marcas de corte en las cuatro esquinas del cuadrado (x, y, lado) en puntos.
+    """
+    hueco, longitud = 0.1 * cm, LONGITUD_MARCA_CM * cm
+    c.setLineWidth(0.3)
+    for cx, sx in ((x, -1), (x + lado, 1)):
+        for cy, sy in ((y, -1), (y + lado, 1)):
+            c.line(cx + sx * hueco, cy, cx + sx * (hueco + longitud), cy)
+            c.line(cx, cy + sy * hueco, cx, cy + sy * (hueco + longitud))
+
+
+def generar_campo(mapa, ruta_pdf, tipo="QR", borde_modulos=2, px_por_modulo=8, procesos=None,
+                  nombre_diccionario=DICCIONARIO_ARUCO_POR_DEFECTO, vectorial=False):
+    """
+    Función para escribir el PDF con todos los marcadores del mapa. Los marcadores se agrupan por lado y
+    se colocan en rejilla dentro de cada hoja. Con `vectorial` se dibujan como trazados en lugar de
+    imágenes. Devuelve el número de marcadores y de páginas.
+    """
+    ids = list(mapa)
+    if tipo == "ArUco":
+        capacidad = len(diccionario_aruco(nombre_diccionario).bytesList)
+        if ids and max(ids) >= capacidad:
+            raise ValueError(f"{nombre_diccionario} sólo tiene {capacidad} IDs y el mapa llega hasta {max(ids)}")
+    # Agrupados por lado para que cada hoja tenga una rejilla regular
+    ids.sort(key=lambda id_marcador: (mapa.indice[id_marcador][0], id_marcador))
+    tareas = [(tipo, str(id_marcador), nombre_diccionario) for id_marcador in ids]
+    # Los IDs caben en la versión 1 del QR, así que todos los marcadores tienen los mismos módulos
+    modulos = matriz_modulos(tipo, '0', 0, nombre_diccionario).shape[0]
+    factor_corte = 1 + 2 * borde_modulos / modulos
+
+    # Se comprueba antes de codificar nada que todos los lados caben en alguna hoja
+    disposiciones = {lado_cm: disposicion_hoja(lado_cm * factor_corte)
+                     for lado_cm in {mapa.indice[id_marcador][0] for id_marcador in ids}}
+
+    c = canvas.Canvas(ruta_pdf, pagesize=A4)
+    paginas = 0
+    posicion = None  # Casilla siguiente de la hoja actual
+    lado_actual = None
+    with _contexto_multiproceso().Pool(procesos) as pool:
+        # imap mantiene el orden y entrega cada matriz en cuanto está lista, así que el PDF se va
+        # escribiendo mientras el resto de procesos sigue codificando
+        for id_marcador, matriz in zip(ids, pool.imap(_codificar, tareas, chunksize=32)):
+            lado_cm, x_m, y_m = mapa.indice[id_marcador]
+            tamaño_hoja, columnas, filas, paso = disposiciones[lado_cm]
+            if posicion is None or lado_cm != lado_actual or posicion >= columnas * filas:
+                if posicion is not None:
+                    c.showPage()
+                c.setPageSize(tamaño_hoja)
+                paginas += 1
+                posicion, lado_actual = 0, lado_cm
+
+            fila, columna = divmod(posicion, columnas)
+            # El marcador ocupa exactamente lado_cm; el margen blanco queda dentro de las marcas de corte.
+            # La rejilla se centra en la hoja
+            lado = lado_cm * cm
+            corte = lado * factor_corte
+            margen_x = (tamaño_hoja[0] - columnas * paso + HUECO_CM * cm) / 2
+            margen_y = (tamaño_hoja[1] - filas * paso + HUECO_CM * cm) / 2
+            x = margen_x + columna * paso + (corte - lado) / 2
+            y = tamaño_hoja[1] - margen_y - fila * paso - corte + (corte - lado) / 2
+            if vectorial:
+                dibujar_matriz_vectorial(c, matriz, x, y, lado)
+            else:
+                imagen = Image.fromarray(np.kron(matriz, np.ones((px_por_modulo, px_por_modulo), dtype=np.uint8)))
+                c.drawImage(ImageReader(imagen), x, y, width=lado, height=lado)
+            dibujar_marcas_corte(c, x - (corte - lado) / 2, y - (corte - lado) / 2, corte)
+            c.setFont("Helvetica", 6)
+            c.drawCentredString(x + lado / 2, y - (corte - lado) / 2 - 0.35 * cm,
+                                f"ID {id_marcador}  x={x_m:g} m  y={y_m:g} m  lado={lado_cm:g} cm")
+            posicion += 1
+
+    if posicion is not None:
+        c.showPage()
+    c.save()
+    return len(ids), paginas
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generador del campo de marcadores de la zona de vuelo')
+    origen = parser.add_mutually_exclusive_group(required=True)
+    origen.add_argument('--mapa', help='Mapa de marcadores (CSV) con los marcadores a imprimir')
+    origen.add_argument('--extension', help='Ancho x alto de la zona en metros, p. ej. 20x10')
+    parser.add_argument('--separacion', type=float, default=1.0, help='Distancia entre marcadores en metros')
+    parser.add_argument('--lado', type=float, default=18.0, help='Lado de cada marcador en cm')
+    parser.add_argument('--origen', default='0,0', help='Posición x,y (m) del primer marcador')
+    parser.add_argument('--tipo', default='QR', choices=['QR', 'ArUco'])
+    parser.add_argument('--diccionario', default=DICCIONARIO_ARUCO_POR_DEFECTO, help='Diccionario ArUco/AprilTag')
+    parser.add_argument('--borde', type=int, default=2, help='Módulos de margen blanco dentro de las marcas de corte')
+    parser.add_argument('--vectorial', action='store_true', help='Dibujar los módulos como trazados vectoriales')
+    parser.add_argument('--procesos', type=int, default=None, help='Procesos para codificar (por defecto, uno por núcleo)')
+    parser.add_argument('--salida', default='campo_marcadores.pdf', help='PDF de salida')
+    parser.add_argument('--salida-mapa', help='Mapa de marcadores de salida (por defecto, junto al PDF)')
+    args = parser.parse_args()
+    if args.lado <= 0:
+        parser.error('--lado debe ser positivo')
+
+    if args.mapa:
+        mapa = MapaMarcadores.cargar(args.mapa)
+        if not len(mapa):
+            raise SystemExit(f"El mapa {args.mapa} no existe o está vacío.")
+    else:
+        try:
+            extension = tuple(float(v) for v in args.extension.lower().split('x'))
+            origen = tuple(float(v) for v in args.origen.split(','))
+        except ValueError:
+            parser.error('--extension es ancho x alto en metros (p. ej. 20x10) y --origen es x,y')
+        if len(extension) != 2 or len(origen) != 2:
+            parser.error('--extension es ancho x alto en metros (p. ej. 20x10) y --origen es x,y')
+        # Con separación 0 la rejilla no avanza y con una negativa queda vacía
+        if args.separacion <= 0:
+            parser.error('--separacion debe ser positiva')
+        if args.separacion * 100 < args.lado:
+            parser.error('--separacion es menor que --lado: los marcadores se solaparían')
+        if min(extension) < 0:
+            parser.error('--extension no puede ser negativa')
+        mapa = mapa_rejilla(extension, args.separacion, args.lado, origen)
+
+    inicio = time.perf_counter()
+    try:
+        marcadores, paginas = generar_campo(mapa, args.salida, args.tipo, args.borde, procesos=args.procesos,
+                                            nombre_diccionario=args.diccionario, vectorial=args.vectorial)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    salida_mapa = args.salida_mapa or os.path.splitext(args.salida)[0] + '.csv'
+    mapa.guardar(salida_mapa)
+    print(f"{marcadores} marcadores en {paginas} páginas ({args.salida}, mapa en {salida_mapa}) "
+          f"en {time.perf_counter() - inicio:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+# ######################################################################################################
+#                                     Proyecto de Localización de Drones
+# Módulo de captura en hilo
+#
+# Descripción:
+# Lee la cámara en un hilo independiente y guarda sólo los fotogramas más recientes en un pequeño buffer
+# circular. La etapa de decodificación siempre recoge el último fotograma disponible, de forma que la
+# latencia de la pose queda acotada por un único tiempo de decodificación y no crece con la cola del
+# driver de la cámara.
+# ######################################################################################################
+
+import threading
+import time
+from collections import namedtuple
+
+import cv2
+
+from instrumentacion import Instrumentacion
+
+FrameCapturado = namedtuple('FrameCapturado', ['frame', 'marca_tiempo', 'secuencia'])
+
+
+class BufferAnillo:
+    """
+    Buffer circular seguro entre hilos que conserva los últimos fotogramas capturados.
+    """
+    def __init__(self, capacidad=2):
+        if capacidad < 1:
+            raise ValueError("La capacidad del buffer debe ser al menos 1.")
+        self.capacidad = capacidad
+        self._huecos = [None] * capacidad
+        self._secuencia = 0
+        self._condicion = threading.Condition()
+
+    def publicar(self, frame, marca_tiempo):
+        """
+        Función para guardar un fotograma nuevo, sobrescribiendo el más antiguo.
+        """
+        with self._condicion:
+            self._secuencia += 1
+            self._huecos[self._secuencia % self.capacidad] = FrameCapturado(frame, marca_tiempo, self._secuencia)
+            self._condicion.notify_all()
+            return self._secuencia
+
+    def mas_reciente(self, posterior_a=0, timeout=None):
+        """
+        Función para obtener el fotograma más reciente con secuencia mayor que `posterior_a`.
+        Devuelve None si no llega ninguno antes del timeout.
+        """
+        with self._condicion:
+            if not self._condicion.wait_for(lambda: self._secuencia > posterior_a, timeout):
+                return None
+            return self._huecos[self._secuencia % self.capacidad]
+
+
+class CapturaHilo:
+    """
+    Clase que lee continuamente de un cv2.VideoCapture en segundo plano y publica en un BufferAnillo.
+    """
+    def __init__(self, cap, capacidad=2, instrumentacion=None):
+        self.cap = cap
+        self.instrumentacion = instrumentacion if instrumentacion is not None else Instrumentacion(activa=False)
+        self.buffer = BufferAnillo(capacidad)
+        self.frames_leidos = 0
+        self.frames_descartados = 0
+        self.errores_lectura = 0
+        self._ultima_secuencia = 0
+        self._configuracion_pendiente = None
+        self._activo = threading.Event()
+        self._hilo = None
+
+    def iniciar(self):
+        """
+        Función para arrancar el hilo de captura.
+        """
+        if self._hilo is not None:
+            return self
+        self._activo.set()
+        self._hilo = threading.Thread(target=self._bucle_captura, name='CapturaHilo', daemon=True)
+        self._hilo.start()
+        return self
+
+    def detener(self):
+        """
+        Función para parar el hilo de captura y esperar a que termine.
+        """
+        self._activo.clear()
+        if self._hilo is not None:
+            self._hilo.join(timeout=1.0)
+            self._hilo = None
+
+    def reconfigurar(self, resolucion, fourcc=None):
+        """
+        Función para pedir otra resolución (ancho, alto) y formato ('MJPG', 'YUYV'...). El cambio lo aplica
+        el propio hilo de captura entre dos lecturas, porque cv2.VideoCapture no admite llamadas desde
+        dos hilos a la vez.
+        """
+        self._configuracion_pendiente = (resolucion, fourcc)
+        if self._hilo is None:
+            self._aplicar_configuracion()
+
+    def _aplicar_configuracion(self):
+        (ancho, alto), fourcc = self._configuracion_pendiente
+        self._configuracion_pendiente = None
+        with self.instrumentacion.medir('reconfiguracion'):
+            if fourcc:
+                self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, ancho)
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, alto)
+
+    def _bucle_captura(self):
+        while self._activo.is_set():
+            if self._configuracion_pendiente is not None:
+                self._aplicar_configuracion()
+            with self.instrumentacion.medir('captura'):
+                ret, frame = self.cap.read()
+            marca_tiempo = time.monotonic()
+            if not ret:
+                self.errores_lectura += 1
+                self.instrumentacion.contar('errores_lectura')
+                time.sleep(0.005)
+                continue
+            self.frames_leidos += 1
+            self.buffer.publicar(frame, marca_tiempo)
+
+    def leer(self, timeout=1.0):
+        """
+        Función para obtener el fotograma más reciente que aún no se ha consumido.
+        Devuelve (FrameCapturado, descartados) o (None, 0) si no llega ningún fotograma a tiempo.
+        """
+        capturado = self.buffer.mas_reciente(self._ultima_secuencia, timeout)
+        if capturado is None:
+            return None, 0
+        descartados = capturado.secuencia - self._ultima_secuencia - 1
+        if self._ultima_secuencia == 0:
+            descartados = 0
+        self.frames_descartados += descartados
+        self.instrumentacion.contar('frames_descartados', descartados)
+        self._ultima_secuencia = capturado.secuencia
+        return capturado, descartados
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *args):
+        self.detener()
@@ -0,0 +1,447 @@
+# ######################################################################################################
+#                                     Proyecto de Localización de Drones
+# Módulo del detector de códigos QR
+#
+# Descripción:
+# Contiene DetectorQR y sus funciones auxiliares: decodificación (con ventana de seguimiento y pirámide
+# en escala de grises y filtro de nitidez previo), fusión de todos los marcadores visibles en una única posición y anotación del
+# fotograma. Al estar separado del bucle principal se puede importar sin abrir la cámara, por ejemplo
+# desde el banco de pruebas (benchmark_detector.py).
+# ######################################################################################################
+
+import math
+
+import cv2
+import numpy as np
+
+from backends_fiduciales import Point, Rect, crear_backend
+from calibracion_camara import CalibracionCamara
+from filtro_nitidez import FiltroNitidez
+from instrumentacion import Instrumentacion
+from mapa_marcadores import MapaMarcadores
+
+# Configuración de la interfaz gráfica
+fuente = cv2.FONT_HERSHEY_SIMPLEX
+tamaño_fuente = 0.5
+tamaño_fuente_grande = 0.75  
+grosor_fuente = 1
+grosor_fuente_grande = 2 
+color_fuente = (255, 255, 255)
+color_contorno_fuente = (0, 0, 0)
+
+# Esquinas de un marcador de lado 1 en el orden del código (arriba-izquierda, arriba-derecha, abajo-derecha,
+# abajo-izquierda), con el marcador en el suelo (z = 0) y su borde superior hacia +y del mapa
+ESQUINAS_MARCADOR = np.array([[-0.5, 0.5, 0], [0.5, 0.5, 0], [0.5, -0.5, 0], [-0.5, -0.5, 0]], dtype=np.float64)
+
+# Error de reproyección (RMS, en píxeles) por encima del cual la pose de un marcador se descarta
+ERROR_REPROYECCION_MAXIMO_PX = 4.0
+# Dos soluciones cuyo error de reproyección difiere menos de esto (en proporción o en píxeles) se consideran
+# igual de buenas: el error no distingue una pose de su reflejo y se elige la cámara menos inclinada
+RAZON_AMBIGUEDAD = 1.5
+MARGEN_AMBIGUEDAD_PX = 0.5
+
+# Definiciones de Funciones
+def trasladar_objeto(obj, dx, dy, escala=1.0):
+    """
+    Función para llevar un objeto decodificado en un recorte (posiblemente reescalado) a coordenadas
+    del fotograma completo.
+    """
+    rect = Rect(int(round(obj.rect.left / escala)) + dx, int(round(obj.rect.top / escala)) + dy,
+                int(round(obj.rect.width / escala)), int(round(obj.rect.height / escala)))
+    polygon = [Point(p.x / escala + dx, p.y / escala + dy) for p in obj.polygon]
+    return obj._replace(rect=rect, polygon=polygon)
+
+def esquinas_cuadrilatero(puntos):
+    """
+    Función para reducir el polígono de un QR a sus cuatro esquinas, recorridas en sentido horario en la
+    imagen (como las da OpenCV; pyzbar las da en sentido antihorario) sin cambiar la primera.
+    """
+    puntos = np.array([tuple(punto) for punto in puntos], dtype=np.float32)
+    if len(puntos) != 4:
+        puntos = cv2.boxPoints(cv2.minAreaRect(puntos))
+    x, y = puntos[:, 0], puntos[:, 1]
+    if np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y) < 0:
+        puntos = puntos[[0, 3, 2, 1]]
+    return puntos
+
+def orientacion_desde_rotacion(rotacion_camara):
+    """
+    Función que devuelve (guiñada, cabeceo, alabeo) del dron en radianes a partir de la rotación
+    cámara -> mundo. En reposo la cámara mira al suelo con su eje x según x del mapa y su eje y según -y.
+    """
+    rotacion = rotacion_camara @ np.diag([1.0, -1.0, -1.0])
+    guiñada = math.atan2(rotacion[1, 0], rotacion[0, 0])
+    cabeceo = math.asin(-max(-1.0, min(1.0, rotacion[2, 0])))
+    alabeo = math.atan2(rotacion[2, 1], rotacion[2, 2])
+    return guiñada, cabeceo, alabeo
+
+
+def elegir_solucion_pnp(rvecs, tvecs, errores):
+    """
+    Función para elegir entre las soluciones de cv2.solvePnPGeneric. Sólo valen las finitas, con el marcador
+    delante de la cámara, la cámara por encima del marcador y un error por debajo del máximo. Entre las que
+    tienen un error parecido al menor se queda la de la cámara que mira más hacia abajo.
+    Devuelve (rotación, tvec, posición de la cámara respecto al marcador) o None.
+    """
+    candidatas = []
+    for rvec, tvec, error in zip(rvecs, tvecs, np.ravel(errores)):
+        if not (np.isfinite(error) and np.isfinite(rvec).all() and np.isfinite(tvec).all()):
+            continue  # IPPE devuelve NaN en la segunda solución de un cuadrado visto de frente
+        rotacion, _ = cv2.Rodrigues(rvec)
+        tvec = tvec.ravel()
+        camara = -rotacion.T @ tvec
+        if tvec[2] <= 0 or camara[2] <= 0 or error > ERROR_REPROYECCION_MAXIMO_PX:
+            continue
+        candidatas.append((float(error), rotacion, tvec, camara))
+    if not candidatas:
+        return None
+    menor_error = min(candidata[0] for candidata in candidatas)
+    limite = max(menor_error * RAZON_AMBIGUEDAD, menor_error + MARGEN_AMBIGUEDAD_PX)
+    # El eje óptico en ejes del marcador es la tercera columna de rotacion.T; mirando al suelo su z es -1
+    _, rotacion, tvec, camara = max((candidata for candidata in candidatas if candidata[0] <= limite),
+                                    key=lambda candidata: -candidata[1][2, 2])
+    return rotacion, tvec, camara
+
+
+def fusionar_posiciones(posiciones, longitudes_lado, lados_cm):
+    """
+    Función para fusionar las posiciones que da cada QR en una sola estimación.
+    Cada QR pesa según su área en píxeles (los QR grandes en la imagen son más precisos).
+    La calidad crece con el número de QR y baja cuando sus estimaciones no coinciden.
+    """
+    pesos = longitudes_lado ** 2
+    posicion = np.average(posiciones, axis=0, weights=pesos)
+
+    dispersion_cm = np.sqrt(np.average(np.sum((posiciones - posicion) ** 2, axis=1), weights=pesos)) * 100
+    calidad = (1 - 0.5 ** len(posiciones)) / (1 + dispersion_cm / lados_cm.mean())
+    return tuple(float(v) for v in posicion), float(calidad)
+
+class DetectorQR:
+    """
+    Clase que se encarga de detectar y procesar los códigos QR en una imagen.
+    """
+    def __init__(self, longitud_focal, distancia_maxima, modo_seguimiento=False, reacquisicion_cada=15,
+                 margen_roi=0.5, usar_gris=True, escalas_decodificacion=(1.0,), dibujar=True, backend=None,
+                 mapa=None, angulo_de_vision=0.74, instrumentacion=None, filtro_nitidez=False, calibracion=None,
+                 resolucion_referencia=None):
+        self.longitud_focal = longitud_focal
+        self.distancia_maxima = distancia_maxima
+        self.backend = backend if backend is not None else crear_backend('pyzbar')
+        self.mapa = mapa if mapa is not None else MapaMarcadores()
+        self.angulo_de_vision = angulo_de_vision  # Ángulo de visión vertical en radianes (None para usar la focal)
+
+        # Calibración de la cámara: la del fichero o, si no hay, una ideal con el ángulo de visión o la focal a
+        # `resolucion_referencia` (ancho, alto); sin ella, a la resolución del primer fotograma
+        self.calibracion = calibracion
+        if self.calibracion is None and resolucion_referencia is not None:
+            self.calibracion = self.calibracion_ideal(resolucion_referencia)
+        self.ultima_orientacion = None  # (guiñada, cabeceo, alabeo) en radianes del último fotograma con pose
+        self.instrumentacion = instrumentacion if instrumentacion is not None else Instrumentacion(activa=False)
+        self.dibujar = dibujar  # False en modo sin pantalla: no se anota ningún fotograma
+
+        # Preprocesado: escala de grises y niveles de la pirámide a probar en orden
+        self.usar_gris = usar_gris
+        self.escalas_decodificacion = tuple(escalas_decodificacion)
+        self.decodificaciones_por_escala = {escala: 0 for escala in self.escalas_decodificacion}
+        self.forma_anterior = None  # Si cambia la resolución, la ventana de seguimiento ya no vale
+
+        # Filtro de nitidez: omite los fotogramas movidos o mal expuestos antes de decodificar
+        self.filtro_nitidez = FiltroNitidez() if filtro_nitidez else None
+
+        # Modo seguimiento: se decodifica sólo una ventana alrededor de la última detección
+        self.modo_seguimiento = modo_seguimiento
+        self.reacquisicion_cada = reacquisicion_cada
+        self.margen_roi = margen_roi
+        self.ultimo_rect = None  # (x0, y0, x1, y1) que engloba los QR del último fotograma
+        self.velocidad = (0.0, 0.0)  # Desplazamiento en píxeles por fotograma de la cámara
+        self.paso_fotogramas = 1  # Fotogramas de la cámara desde la llamada anterior (en el pool, uno de cada varios)
+        self.pixeles_por_m = None  # Escala de los QR del último fotograma, para convertir pistas en metros
+        self.frames_desde_completo = 0
+        self.decodificaciones_roi = 0
+        self.decodificaciones_completas = 0
+
+    def calibracion_ideal(self, resolucion):
+        """
+        Función para crear la calibración sin distorsión que se usa cuando no hay fichero de calibración.
+        """
+        if self.angulo_de_vision is not None:
+            return CalibracionCamara.desde_angulo_de_vision(self.angulo_de_vision, resolucion)
+        return CalibracionCamara.desde_longitud_focal(self.longitud_focal, resolucion)
+
+    def ventana_busqueda(self, alto, ancho):
+        """
+        Función para predecir la región de interés donde buscar el QR en el siguiente fotograma.
+        Devuelve None cuando toca una búsqueda en la imagen completa.
+        """
+        if not self.modo_seguimiento or self.ultimo_rect is None:
+            return None
+        if self.frames_desde_completo >= self.reacquisicion_cada:
+            return None
+
+        x0, y0, x1, y1 = self.ultimo_rect
+        dx, dy = self.velocidad[0] * self.paso_fotogramas, self.velocidad[1] * self.paso_fotogramas
+        if not (math.isfinite(dx) and math.isfinite(dy)):
+            self.velocidad = (0.0, 0.0)
+            return None
+        margen_x = (x1 - x0) * self.margen_roi + abs(dx)
+        margen_y = (y1 - y0) * self.margen_roi + abs(dy)
+        x0 = max(0, int(x0 + dx - margen_x))
+        y0 = max(0, int(y0 + dy - margen_y))
+        x1 = min(ancho, int(x1 + dx + margen_x))
+        y1 = min(alto, int(y1 + dy + margen_y))
+        if x1 - x0 < 2 or y1 - y0 < 2:
+            return None
+        return x0, y0, x1, y1
+
+    def aplicar_pista(self, desplazamiento_m):
+        """
+        Función para usar el desplazamiento previsto del dron (en metros, desde el último fotograma con
+        detección) como desplazamiento de la ventana de búsqueda, en lugar del medido entre fotogramas.
+        """
+        if desplazamiento_m is None or self.ultimo_rect is None or self.pixeles_por_m is None:
+            return
+        # El desplazamiento viene en ejes del mapa: se pasa a los de la cámara con la guiñada del último
+        # fotograma. Si el dron avanza según x de la cámara el QR se desplaza a la izquierda en la imagen;
+        # según -y de la cámara, hacia abajo
+        guiñada = self.ultima_orientacion[0] if self.ultima_orientacion is not None else 0.0
+        coseno, seno = math.cos(guiñada), math.sin(guiñada)
+        avance = desplazamiento_m[0] * coseno + desplazamiento_m[1] * seno
+        lateral = -desplazamiento_m[0] * seno + desplazamiento_m[1] * coseno
+        if not (math.isfinite(avance) and math.isfinite(lateral)):
+            return  # Una pista no finita se ignora y se conserva el desplazamiento medido
+        self.velocidad = (-avance * self.pixeles_por_m, lateral * self.pixeles_por_m)
+
+    def ajustar_escalas(self, escalas_decodificacion):
+        """
+        Función para cambiar en marcha los niveles de la pirámide que se prueban.
+        """
+        self.escalas_decodificacion = tuple(escalas_decodificacion)
+        for escala in self.escalas_decodificacion:
+            self.decodificaciones_por_escala.setdefault(escala, 0)
+
+    def preprocesar(self, frame):
+        """
+        Función para preparar el fotograma antes de decodificarlo (conversión a grises una única vez).
+        """
+        if self.usar_gris and frame.ndim == 3:
+            return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return frame
+
+    def decodificar_region(self, imagen, x0=0, y0=0):
+        """
+        Función para decodificar una imagen probando primero los niveles reducidos de la pirámide.
+        Sólo se pasa a la siguiente escala si la anterior no encuentra nada.
+        """
+        for escala in self.escalas_decodificacion:
+            if escala == 1.0:
+                reducida = imagen
+            else:
+                reducida = cv2.resize(imagen, None, fx=escala, fy=escala, interpolation=cv2.INTER_AREA)
+            with self.instrumentacion.medir('decodificacion'):
+                objetos = self.backend.detectar(reducida)
+            if objetos:
+                self.decodificaciones_por_escala[escala] += 1
+                return [trasladar_objeto(obj, x0, y0, escala) for obj in objetos]
+        return []
+
+    def decodificar(self, frame):
+        """
+        Función para decodificar los QR del fotograma, usando la ventana de seguimiento si la hay.
+        Las coordenadas devueltas están siempre referidas al fotograma completo.
+        """
+        imagen = self.preprocesar(frame)
+        if imagen.shape[:2] != self.forma_anterior:
+            self.forma_anterior = imagen.shape[:2]
+            self.actualizar_seguimiento([])
+        ventana = self.ventana_busqueda(imagen.shape[0], imagen.shape[1])
+        objetos_decodificados = []
+        if ventana is not None:
+            x0, y0, x1, y1 = ventana
+            self.decodificaciones_roi += 1
+            self.frames_desde_completo += 1
+            objetos_decodificados = self.decodificar_region(imagen[y0:y1, x0:x1], x0, y0)
+
+        # Reacquisición en la imagen completa cada N fotogramas o tras un fallo en la ventana
+        if not objetos_decodificados:
+            self.decodificaciones_completas += 1
+            self.frames_desde_completo = 0
+            objetos_decodificados = self.decodificar_region(imagen)
+
+        self.actualizar_seguimiento(objetos_decodificados)
+        return objetos_decodificados
+
+    def actualizar_seguimiento(self, objetos_decodificados):
+        """
+        Función para actualizar la ventana y la velocidad estimada a partir de las últimas detecciones.
+        """
+        if not objetos_decodificados:
+            self.ultimo_rect = None
+            self.velocidad = (0.0, 0.0)
+            return
+
+        x0 = min(obj.rect.left for obj in objetos_decodificados)
+        y0 = min(obj.rect.top for obj in objetos_decodificados)
+        x1 = max(obj.rect.left + obj.rect.width for obj in objetos_decodificados)
+        y1 = max(obj.rect.top + obj.rect.height for obj in objetos_decodificados)
+        if self.ultimo_rect is not None:
+            ax0, ay0, ax1, ay1 = self.ultimo_rect
+            self.velocidad = ((x0 + x1 - ax0 - ax1) / (2 * self.paso_fotogramas),
+                              (y0 + y1 - ay0 - ay1) / (2 * self.paso_fotogramas))
+        self.ultimo_rect = (x0, y0, x1, y1)
+
+    def encontrar_codigos_qr(self, frame, dibujar=None):
+        """
+        Función para encontrar códigos QR en una imagen y procesarlos.
+        Todos los QR visibles se fusionan en una única posición del dron con una calidad entre 0 y 1.
+        Si `dibujar` es False no se anota nada sobre el fotograma (modo sin pantalla).
+        """
+        if dibujar is None:
+            dibujar = self.dibujar
+        instrumentacion = self.instrumentacion
+        imagen = self.preprocesar(frame)
+        if self.filtro_nitidez is not None:
+            with instrumentacion.medir('nitidez'):
+                aceptado = self.filtro_nitidez.aceptar(imagen)
+            if not aceptado:
+                instrumentacion.contar('frames_omitidos_nitidez')
+                return [], frame, None, 0.0
+            instrumentacion.contar('frames_aceptados_nitidez')
+
+        objetos_decodificados = self.decodificar(imagen)
+        if self.filtro_nitidez is not None:
+            self.filtro_nitidez.informar(bool(objetos_decodificados))
+
+        with instrumentacion.medir('esquinas'):
+            validos, esquinas, referencias = [], [], []
+            for obj in objetos_decodificados:
+                longitud, x, y = self.mapa.valores(obj.data.decode('utf-8'))
+                if longitud is None or x is None or y is None:
+                    continue
+                validos.append(obj)
+                esquinas.append(esquinas_cuadrilatero(obj.polygon))
+                referencias.append((longitud, x, y))
+
+        if not validos:
+            instrumentacion.contar('fallos_decodificacion')
+            return objetos_decodificados, frame, None, 0.0
+
+        with instrumentacion.medir('geometria'):
+            esquinas = np.array(esquinas, dtype=np.float64)  # (N, 4, 2)
+            referencias = np.array(referencias, dtype=np.float64)  # (N, 3): lado, x, y
+            longitudes_lado = self.calcular_longitudes_lado(esquinas)
+            posiciones, alturas_imagen_cm, distancias, rotaciones, validas = self.calcular_posiciones(
+                esquinas, longitudes_lado, referencias, frame.shape)
+            # Los marcadores sin una pose creíble (detrás de la cámara o con mucho error) no se publican
+            if not validas.all():
+                instrumentacion.contar('poses_rechazadas', int(np.count_nonzero(~validas)))
+                validos = [obj for obj, valida in zip(validos, validas) if valida]
+                esquinas, referencias, longitudes_lado = esquinas[validas], referencias[validas], longitudes_lado[validas]
+                posiciones, alturas_imagen_cm = posiciones[validas], alturas_imagen_cm[validas]
+                distancias, rotaciones = distancias[validas], rotaciones[validas]
+                if not validos:
+                    return objetos_decodificados, frame, None, 0.0
+            coordenadas_dron, calidad = fusionar_posiciones(posiciones, longitudes_lado, referencias[:, 0])
+            # La orientación se toma del marcador más grande en la imagen, que es el más preciso
+            self.ultima_orientacion = orientacion_desde_rotacion(rotaciones[int(np.argmax(longitudes_lado))])
+            self.pixeles_por_m = float(np.mean(longitudes_lado / referencias[:, 0])) * 100
+
+        if dibujar:
+            with instrumentacion.medir('anotacion'):
+                for i, obj in enumerate(validos):
+                    self.anotar_qr(frame, obj, esquinas[i], longitudes_lado[i], alturas_imagen_cm[i], distancias[i],
+                                   posiciones[i])
+
+        return objetos_decodificados, frame, coordenadas_dron, calidad
+
+    def anotar_qr(self, frame, obj, puntos, longitud_lado, altura_imagen_cm, distancia, posicion):
+        """
+        Función para dibujar el contorno, el vector y los datos de un código QR sobre el fotograma.
+        """
+        cv2.drawContours(frame, [np.intp(puntos)], 0, (255, 0, 255), 2)
+
+        ubicacion_texto_longitud_lado = (obj.rect.left, obj.rect.top - 10)
+        cv2.putText(frame, f"Longitud del lado: {longitud_lado:.2f} cm", ubicacion_texto_longitud_lado,
+                    fuente, tamaño_fuente, color_contorno_fuente, grosor_fuente + 2, cv2.LINE_AA)
+        cv2.putText(frame, f"Longitud del lado: {longitud_lado:.2f} cm", ubicacion_texto_longitud_lado,
+                    fuente, tamaño_fuente, color_fuente, grosor_fuente, cv2.LINE_AA)
+
+        ubicacion_texto_altura_imagen = (obj.rect.left, obj.rect.top - 30)
+        cv2.putText(frame, f"Altura de la imagen: {altura_imagen_cm:.2f} cm", ubicacion_texto_altura_imagen,
+                    fuente, tamaño_fuente, color_contorno_fuente, grosor_fuente + 2, cv2.LINE_AA)
+        cv2.putText(frame, f"Altura de la imagen: {altura_imagen_cm:.2f} cm", ubicacion_texto_altura_imagen,
+                    fuente, tamaño_fuente, color_fuente, grosor_fuente, cv2.LINE_AA)
+
+        ubicacion_texto_distancia = (obj.rect.left, obj.rect.top - 50)
+        cv2.putText(frame, f"Distancia: {distancia:.2f} cm", ubicacion_texto_distancia,
+                    fuente, tamaño_fuente, color_contorno_fuente, grosor_fuente + 2, cv2.LINE_AA)
+        cv2.putText(frame, f"Distancia: {distancia:.2f} cm", ubicacion_texto_distancia,
+                    fuente, tamaño_fuente, color_fuente, grosor_fuente, cv2.LINE_AA)
+
+        texto_qr = obj.data.decode('utf-8')
+        ubicacion_texto_qr = (obj.rect.left, obj.rect.top - 70)
+        cv2.putText(frame, f"Código QR: {texto_qr}", ubicacion_texto_qr,
+                    fuente, tamaño_fuente, color_contorno_fuente, grosor_fuente + 2, cv2.LINE_AA)
+        cv2.putText(frame, f"Código QR: {texto_qr}", ubicacion_texto_qr,
+                    fuente, tamaño_fuente, color_fuente, grosor_fuente, cv2.LINE_AA)
+
+        mitad_frame = (frame.shape[1] // 2, frame.shape[0] // 2)
+        mitad_qr = tuple(int(v) for v in np.mean(puntos, axis=0))
+        cv2.line(frame, mitad_frame, mitad_qr, (0, 255, 0), 2)
+
+        offset_texto_x = 10  
+        offset_texto_y = 10  
+        ubicacion_texto_vector = (mitad_qr[0] + offset_texto_x, mitad_qr[1] + offset_texto_y)
+        
+        texto_vector = f"Vec:({posicion[0] * 100:.2f},{posicion[1] * 100:.2f}) cm"
+        cv2.putText(frame, texto_vector, ubicacion_texto_vector,
+                    fuente, tamaño_fuente, color_contorno_fuente, grosor_fuente + 2, cv2.LINE_AA)
+        cv2.putText(frame, texto_vector, ubicacion_texto_vector,
+                    fuente, tamaño_fuente, color_fuente, grosor_fuente, cv2.LINE_AA)
+
+    def calcular_longitudes_lado(self, esquinas):
+        """
+        Función para calcular la longitud del lado (en píxeles) de cada cuadrilátero de un array (N, 4, 2).
+        """
+        lados = np.roll(esquinas, -1, axis=1) - esquinas
+        return np.linalg.norm(lados, axis=2).max(axis=1)
+
+    def calcular_posiciones(self, esquinas, longitudes_lado, referencias, forma_frame):
+        """
+        Función para calcular la posición del dron (en metros) que da cada código QR con cv2.solvePnPGeneric
+        sobre sus esquinas, corregidas antes de distorsión con la tabla de la calibración.
+        Devuelve las posiciones (N, 3), la altura de la imagen en cm, la distancia en cm de cada QR, la
+        rotación cámara -> mundo (N, 3, 3) de cada uno y qué QR tienen una pose válida (N,).
+        """
+        lados_cm, x_ref, y_ref = referencias[:, 0], referencias[:, 1], referencias[:, 2]
+        alturas_imagen_cm = (forma_frame[0] / longitudes_lado) * lados_cm
+
+        resolucion = (forma_frame[1], forma_frame[0])
+        if self.calibracion is None:
+            self.calibracion = self.calibracion_ideal(resolucion)
+        matriz_camara, _ = self.calibracion.preparar(resolucion)
+        esquinas = self.calibracion.corregir_puntos(esquinas, resolucion)
+
+        posiciones = np.empty((len(esquinas), 3))
+        distancias = np.empty(len(esquinas))
+        rotaciones = np.empty((len(esquinas), 3, 3))
+        validas = np.zeros(len(esquinas), dtype=bool)
+        for i in range(len(esquinas)):
+            # IPPE_SQUARE es la solución cerrada para un cuadrado plano con este orden de esquinas. Da dos
+            # soluciones (la ambigüedad de un plano visto casi de frente). Con un cuadrado exactamente de
+            # frente IPPE degenera (rotaciones enormes o NaN con errores de pocos píxeles), así que se juntan sus
+            # soluciones con la de SQPNP y se elige entre todas
+            rvecs, tvecs, errores = [], [], []
+            for metodo in (cv2.SOLVEPNP_IPPE_SQUARE, cv2.SOLVEPNP_SQPNP):
+                _, rvecs_metodo, tvecs_metodo, errores_metodo = cv2.solvePnPGeneric(
+                    ESQUINAS_MARCADOR * (lados_cm[i] / 100), esquinas[i], matriz_camara, None, flags=metodo)
+                rvecs.extend(rvecs_metodo)
+                tvecs.extend(tvecs_metodo)
+                errores.extend(np.ravel(errores_metodo))
+            solucion = elegir_solucion_pnp(rvecs, tvecs, errores)
+            if solucion is not None:
+                rotacion, tvec, camara = solucion  # camara: posición respecto al centro del marcador
+                posiciones[i] = (x_ref[i] + camara[0], y_ref[i] + camara[1], camara[2])
+                distancias[i] = np.linalg.norm(tvec) * 100
+                rotaciones[i] = rotacion.T
+                validas[i] = True
+        return posiciones, alturas_imagen_cm, distancias, rotaciones, validas
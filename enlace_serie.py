@@ -0,0 +1,268 @@
+# ######################################################################################################
+#                                     Proyecto de Localización de Drones
+# Módulo del enlace serie con el controlador de vuelo
+#
+# Descripción:
+# Envía la pose a la placa de control (Arduino) en tramas binarias de tamaño fijo con suma de
+# comprobación, en lugar de texto. La escritura la hace un hilo dedicado con un buzón de un solo hueco:
+# cada pose nueva sustituye a la pendiente y las que esperan demasiado al hilo se descartan, así que
+# el bucle de visión nunca se bloquea en write() y el controlador siempre recibe la pose más reciente. Se
+# miden la latencia del enlace (desde la marca de tiempo de la pose hasta que sale por el puerto) y los
+# descartes. El destino puede ser un puerto serie o un pty (configurados con termios) o un socket TCP
+# para probar sin placa; `python enlace_serie.py --escuchar tcp://0.0.0.0:5760` hace de placa y muestra
+# las tramas recibidas.
+#
+# Formato de la trama (little endian, 39 bytes):
+#   0  cabecera      2 bytes  0xAA 0x55
+#   2  versión       uint8
+#   3  secuencia     uint16
+#   5  marca_tiempo  uint32   microsegundos del reloj monotónico (módulo 2^32)
+#   9  x, y, z       3 float32  metros
+#   21 guiñada, cabeceo, alabeo  3 float32  radianes (NaN si no se conocen)
+#   33 calidad       uint8    0-255
+#   34 num_qr        uint8
+#   35 edad          uint16   milisegundos entre la marca de tiempo y el envío
+#   37 crc           uint16   CRC-16/CCITT (polinomio 0x1021, valor inicial 0xFFFF) de los bytes 0-36
+# ######################################################################################################
+
+import argparse
+import binascii
+import math
+import os
+import socket
+import struct
+import sys
+import termios
+import threading
+import time
+import tty
+
+from instrumentacion import Instrumentacion
+
+CABECERA = b'\xaa\x55'
+VERSION_TRAMA = 1
+FORMATO_CUERPO = struct.Struct('<2sBHIffffffBBH')
+FORMATO_CRC = struct.Struct('<H')
+TAMAÑO_TRAMA = FORMATO_CUERPO.size + FORMATO_CRC.size
+
+
+def empaquetar_pose(registro, secuencia, edad=0.0):
+    """
+    Función para convertir un registro de pose en una trama binaria con su CRC.
+    """
+    cuerpo = FORMATO_CUERPO.pack(
+        CABECERA, VERSION_TRAMA, secuencia & 0xFFFF, int(registro['marca_tiempo'] * 1e6) & 0xFFFFFFFF,
+        registro['x'], registro['y'], registro['z'],
+        registro.get('guinada', math.nan), registro.get('cabeceo', math.nan), registro.get('alabeo', math.nan),
+        max(0, min(255, int(round(registro.get('calidad', 0.0) * 255)))),
+        min(255, registro.get('num_qr', 0)),
+        max(0, min(0xFFFF, int(edad * 1000))))
+    return cuerpo + FORMATO_CRC.pack(binascii.crc_hqx(cuerpo, 0xFFFF))
+
+
+def desempaquetar_pose(trama):
+    """
+    Función para leer una trama completa. Devuelve el registro o None si la cabecera o el CRC no cuadran.
+    """
+    if len(trama) != TAMAÑO_TRAMA or not trama.startswith(CABECERA):
+        return None
+    cuerpo = trama[:FORMATO_CUERPO.size]
+    if FORMATO_CRC.unpack(trama[FORMATO_CUERPO.size:])[0] != binascii.crc_hqx(cuerpo, 0xFFFF):
+        return None
+    (_, version, secuencia, marca_tiempo_us, x, y, z, guinada, cabeceo, alabeo, calidad, num_qr,
+     edad_ms) = FORMATO_CUERPO.unpack(cuerpo)
+    return {'version': version, 'secuencia': secuencia, 'marca_tiempo_us': marca_tiempo_us, 'x': x, 'y': y,
+            'z': z, 'guinada': guinada, 'cabeceo': cabeceo, 'alabeo': alabeo, 'calidad': calidad / 255,
+            'num_qr': num_qr, 'edad_ms': edad_ms}
+
+
+class LectorTramas:
+    """
+    Clase que reconstruye las tramas a partir de un flujo de bytes, resincronizando con la cabecera
+    cuando se pierden o corrompen bytes (es lo que tiene que hacer el lado del Arduino).
+    """
+    def __init__(self):
+        self._pendiente = bytearray()
+        self.errores_crc = 0
+
+    def alimentar(self, datos):
+        """
+        Función que añade bytes recibidos y devuelve la lista de registros completos y válidos.
+        """
+        self._pendiente += datos
+        registros = []
+        while True:
+            inicio = self._pendiente.find(CABECERA)
+            if inicio < 0:
+                del self._pendiente[:max(0, len(self._pendiente) - 1)]
+                return registros
+            del self._pendiente[:inicio]
+            if len(self._pendiente) < TAMAÑO_TRAMA:
+                return registros
+            registro = desempaquetar_pose(bytes(self._pendiente[:TAMAÑO_TRAMA]))
+            if registro is None:
+                self.errores_crc += 1
+                del self._pendiente[:1]
+                continue
+            del self._pendiente[:TAMAÑO_TRAMA]
+            registros.append(registro)
+
+
+class EnlaceSerie:
+    """
+    Clase que publica registros de pose por el enlace binario desde un hilo escritor propio.
+    Tiene la misma interfaz que PublicadorPose (publicar y cerrar).
+    `destino` puede ser "serial:///dev/ttyACM0", la ruta de un pty o "tcp://host:puerto".
+    """
+    def __init__(self, destino, baudios=115200, antiguedad_maxima=0.1, instrumentacion=None):
+        self.destino = destino
+        self.baudios = baudios
+        # Segundos que una pose puede esperar en el buzón antes de descartarse. Se cuentan desde que se publica
+        # y no desde la captura, que con la decodificación a pocos fotogramas por segundo ya es mayor
+        self.antiguedad_maxima = antiguedad_maxima
+        self.instrumentacion = instrumentacion if instrumentacion is not None else Instrumentacion()
+        self.enviados = 0
+        self.sustituidos = 0  # Poses que no llegaron a salir porque llegó otra más nueva
+        self.caducados = 0  # Poses que esperaron demasiado al hilo escritor
+        self.errores = 0
+        self._secuencia = 0
+        self._pendiente = None
+        self._condicion = threading.Condition()
+        self._activo = True
+        self._descriptor = None
+        self._socket = None
+        self._abrir()
+        self._hilo = threading.Thread(target=self._bucle_escritura, name='EnlaceSerie', daemon=True)
+        self._hilo.start()
+
+    def _abrir(self):
+        if self.destino.startswith('tcp://'):
+            host, puerto = self.destino[len('tcp://'):].rsplit(':', 1)
+            self._socket = socket.create_connection((host, int(puerto)), timeout=1.0)
+            self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            return
+        ruta = self.destino[len('serial://'):] if self.destino.startswith('serial://') else self.destino
+        self._descriptor = os.open(ruta, os.O_RDWR | os.O_NOCTTY)
+        if os.isatty(self._descriptor):
+            # Modo crudo: sin traducción de fin de línea ni eco, que corromperían la trama binaria
+            tty.setraw(self._descriptor)
+            atributos = termios.tcgetattr(self._descriptor)
+            velocidad = getattr(termios, f'B{self.baudios}')
+            atributos[4] = atributos[5] = velocidad
+            termios.tcsetattr(self._descriptor, termios.TCSANOW, atributos)
+
+    def publicar(self, registro):
+        """
+        Función para dejar la pose en el buzón sin bloquear; sustituye a la pendiente si no ha salido aún.
+        """
+        with self._condicion:
+            if self._pendiente is not None:
+                self.sustituidos += 1
+                self.instrumentacion.contar('tramas_sustituidas')
+            self._pendiente = (registro, time.monotonic())
+            self._condicion.notify()
+        return True
+
+    def _bucle_escritura(self):
+        while True:
+            with self._condicion:
+                while self._activo and self._pendiente is None:
+                    self._condicion.wait()
+                if not self._activo:
+                    return
+                registro, encolado = self._pendiente
+                self._pendiente = None
+
+            ahora = time.monotonic()
+            if ahora - encolado > self.antiguedad_maxima:
+                self.caducados += 1
+                self.instrumentacion.contar('tramas_caducadas')
+                if self.caducados == 1 or self.caducados % 100 == 0:
+                    print(f"Enlace serie: {self.caducados} poses descartadas por esperar más de "
+                          f"{self.antiguedad_maxima * 1000:.0f} ms al puerto", file=sys.stderr)
+                continue
+            edad = ahora - registro['marca_tiempo']
+            self._secuencia += 1
+            trama = empaquetar_pose(registro, self._secuencia, edad)
+            try:
+                if self._socket is not None:
+                    self._socket.sendall(trama)
+                else:
+                    os.write(self._descriptor, trama)
+            except OSError:
+                self.errores += 1
+                self.instrumentacion.contar('errores_enlace')
+                continue
+            enviado = time.monotonic()
+            self.enviados += 1
+            self.instrumentacion.registrar('latencia_enlace', enviado - registro['marca_tiempo'])
+            self.instrumentacion.registrar('espera_enlace', enviado - encolado)
+
+    def estadisticas(self):
+        """
+        Función que devuelve los percentiles de latencia del enlace y los contadores de envío.
+        """
+        etapas = self.instrumentacion.resumen()['etapas']
+        return {'latencia': etapas.get('latencia_enlace'), 'espera': etapas.get('espera_enlace'),
+                'enviados': self.enviados, 'sustituidos': self.sustituidos, 'caducados': self.caducados,
+                'errores': self.errores}
+
+    def cerrar(self):
+        """
+        Función para parar el hilo escritor y cerrar el puerto.
+        """
+        with self._condicion:
+            self._activo = False
+            self._condicion.notify()
+        self._hilo.join(timeout=1.0)
+        if self._socket is not None:
+            self._socket.close()
+        if self._descriptor is not None:
+            os.close(self._descriptor)
+
+
+def escuchar(destino):
+    """
+    Función que hace de controlador de vuelo: recibe tramas por TCP o por un pty/puerto serie y las
+    escribe como texto, con las tramas recibidas por segundo y los errores de CRC.
+    """
+    lector = LectorTramas()
+    if destino.startswith('tcp://'):
+        host, puerto = destino[len('tcp://'):].rsplit(':', 1)
+        servidor = socket.create_server((host, int(puerto)))
+        conexion, _ = servidor.accept()
+        leer = lambda: conexion.recv(4096)
+    else:
+        ruta = destino[len('serial://'):] if destino.startswith('serial://') else destino
+        descriptor = os.open(ruta, os.O_RDONLY | os.O_NOCTTY)
+        if os.isatty(descriptor):
+            tty.setraw(descriptor)
+        leer = lambda: os.read(descriptor, 4096)
+
+    recibidas = 0
+    inicio = time.monotonic()
+    while True:
+        datos = leer()
+        if not datos:
+            break
+        for registro in lector.alimentar(datos):
+            recibidas += 1
+            frecuencia = recibidas / max(time.monotonic() - inicio, 1e-6)
+            sys.stdout.write(f"#{registro['secuencia']} x={registro['x']:.3f} y={registro['y']:.3f} "
+                             f"z={registro['z']:.3f} calidad={registro['calidad']:.2f} edad={registro['edad_ms']} ms "
+                             f"({frecuencia:.1f} tramas/s, {lector.errores_crc} errores CRC)\n")
+            sys.stdout.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Receptor de prueba del enlace binario de pose')
+    parser.add_argument('--escuchar', required=True, help='tcp://host:puerto, serial:///dev/tty... o ruta de un pty')
+    args = parser.parse_args()
+    try:
+        escuchar(args.escuchar)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+# ######################################################################################################
+#                                     Proyecto de Localización de Drones
+# Módulo del estimador de pose
+#
+# Descripción:
+# Filtro de Kalman de velocidad constante sobre la salida de DetectorQR. Filtra posición y velocidad,
+# extrapola la pose al instante actual a partir de la marca de tiempo de captura (compensando la latencia
+# de la decodificación) y la publica a una frecuencia fija, mayor que la de la cámara, para que el control
+# reciba actualizaciones regulares aunque la decodificación vaya a 5-10 Hz. La velocidad estimada también
+# sirve como pista para colocar la ventana de búsqueda del detector.
+# ######################################################################################################
+
+import threading
+import time
+
+import numpy as np
+
+
+class FiltroKalmanVelocidad:
+    """
+    Clase con un filtro de Kalman de estado (x, y, z, vx, vy, vz) y modelo de velocidad constante.
+    """
+    def __init__(self, ruido_aceleracion=2.0, ruido_medida=(0.02, 0.02, 0.05)):
+        self.ruido_aceleracion = ruido_aceleracion  # Densidad espectral de la aceleración (m²/s³)
+        self.ruido_medida = np.asarray(ruido_medida, dtype=np.float64)  # Desviación típica (m) con calidad 1
+        self.estado = None
+        self.covarianza = None
+        self.marca_tiempo = None
+        self.calidad = 0.0
+        self.orientacion = None  # Última orientación medida; no se filtra
+        self.medidas = 0
+        self._cerrojo = threading.Lock()
+
+    @staticmethod
+    def _transicion(dt):
+        matriz = np.eye(6)
+        matriz[0:3, 3:6] = np.eye(3) * dt
+        return matriz
+
+    def _ruido_proceso(self, dt):
+        q = self.ruido_aceleracion
+        ruido = np.zeros((6, 6))
+        ruido[0:3, 0:3] = np.eye(3) * q * dt ** 3 / 3
+        ruido[0:3, 3:6] = ruido[3:6, 0:3] = np.eye(3) * q * dt ** 2 / 2
+        ruido[3:6, 3:6] = np.eye(3) * q * dt
+        return ruido
+
+    def actualizar(self, coordenadas_dron, marca_tiempo, calidad=1.0, orientacion=None):
+        """
+        Función para incorporar una medida de posición tomada en `marca_tiempo` (reloj monotónico).
+        Las medidas más antiguas que la última incorporada se ignoran, y también las que no son finitas: una
+        sola medida NaN dejaría el estado y la covarianza en NaN para el resto del vuelo.
+        """
+        medida = np.asarray(coordenadas_dron, dtype=np.float64)
+        if not np.isfinite(medida).all():
+            return False
+        desviacion = self.ruido_medida / max(calidad, 0.05)
+        with self._cerrojo:
+            if self.estado is None:
+                self.estado = np.concatenate([medida, np.zeros(3)])
+                self.covarianza = np.diag(np.concatenate([desviacion ** 2, np.ones(3)]))
+            else:
+                dt = marca_tiempo - self.marca_tiempo
+                if dt < 0:
+                    return False
+                transicion = self._transicion(dt)
+                estado = transicion @ self.estado
+                covarianza = transicion @ self.covarianza @ transicion.T + self._ruido_proceso(dt)
+
+                # Se mide sólo la posición: H = [I 0]
+                innovacion = medida - estado[0:3]
+                s = covarianza[0:3, 0:3] + np.diag(desviacion ** 2)
+                ganancia = covarianza[:, 0:3] @ np.linalg.inv(s)
+                self.estado = estado + ganancia @ innovacion
+                self.covarianza = covarianza - ganancia @ covarianza[0:3, :]
+            self.marca_tiempo = marca_tiempo
+            self.calidad = calidad
+            self.orientacion = orientacion
+            self.medidas += 1
+            return True
+
+    def predecir(self, marca_tiempo):
+        """
+        Función que devuelve (posición, velocidad, antigüedad) extrapoladas a `marca_tiempo` sin modificar
+        el estado, o None si todavía no hay ninguna medida.
+        """
+        with self._cerrojo:
+            if self.estado is None:
+                return None
+            antiguedad = max(0.0, marca_tiempo - self.marca_tiempo)
+            estado = self._transicion(antiguedad) @ self.estado
+        return estado[0:3], estado[3:6], antiguedad
+
+    def desplazamiento(self, desde, hasta):
+        """
+        Función que devuelve el desplazamiento previsto (m) entre dos instantes, según la velocidad estimada.
+        """
+        with self._cerrojo:
+            if self.estado is None:
+                return None
+            return self.estado[3:6] * (hasta - desde)
+
+
+class SalidaFrecuenciaFija:
+    """
+    Clase que publica en un hilo aparte la pose extrapolada al instante actual a una frecuencia fija.
+    Si la última medida es más antigua que `antiguedad_maxima` no se publica nada.
+    """
+    def __init__(self, filtro, publicador, frecuencia=50.0, antiguedad_maxima=0.5):
+        self.filtro = filtro
+        self.publicador = publicador
+        self.periodo = 1.0 / frecuencia
+        self.antiguedad_maxima = antiguedad_maxima
+        self.publicadas = 0
+        self._activo = threading.Event()
+        self._hilo = None
+
+    def iniciar(self):
+        self._activo.set()
+        self._hilo = threading.Thread(target=self._bucle, name='SalidaFrecuenciaFija', daemon=True)
+        self._hilo.start()
+        return self
+
+    def _bucle(self):
+        siguiente = time.monotonic()
+        while self._activo.is_set():
+            siguiente += self.periodo
+            ahora = time.monotonic()
+            prediccion = self.filtro.predecir(ahora)
+            if prediccion is not None and prediccion[2] <= self.antiguedad_maxima:
+                posicion, velocidad, antiguedad = prediccion
+                self.publicadas += 1
+                registro = {
+                    'secuencia': self.publicadas,
+                    'marca_tiempo': ahora,
+                    'x': float(posicion[0]),
+                    'y': float(posicion[1]),
+                    'z': float(posicion[2]),
+                    'vx': float(velocidad[0]),
+                    'vy': float(velocidad[1]),
+                    'vz': float(velocidad[2]),
+                    'calidad': self.filtro.calidad,
+                    'antiguedad': antiguedad,
+                }
+                orientacion = self.filtro.orientacion
+                if orientacion is not None:
+                    registro['guinada'], registro['cabeceo'], registro['alabeo'] = (float(v) for v in orientacion)
+                self.publicador.publicar(registro)
+            # Sin deriva: se espera hasta el siguiente instante del calendario, no un periodo completo
+            espera = siguiente - time.monotonic()
+            if espera > 0:
+                time.sleep(espera)
+            else:
+                siguiente = time.monotonic()
+
+    def detener(self):
+        self._activo.clear()
+        if self._hilo is not None:
+            self._hilo.join(timeout=1.0)
+            self._hilo = None
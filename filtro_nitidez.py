@@ -0,0 +1,83 @@
+# ######################################################################################################
+#                                     Proyecto de Localización de Drones
+# Módulo del filtro de nitidez
+#
+# Descripción:
+# Comprobación barata de la calidad del fotograma antes de decodificar. En vuelo muchos fotogramas salen
+# movidos o mal expuestos y el decodificador gasta en ellos su coste completo sin encontrar nada. Se mide
+# la varianza del Laplaciano (nitidez), el brillo medio y el contraste sobre una copia reducida en grises,
+# y se omiten los fotogramas por debajo de un umbral adaptativo: una fracción de la nitidez típica de los
+# fotogramas que sí se decodificaron. Así el umbral se ajusta solo a la cámara, la escena y la luz.
+# ######################################################################################################
+
+import cv2
+
+
+class FiltroNitidez:
+    """
+    Clase que decide si merece la pena decodificar un fotograma y cuenta los aceptados y omitidos.
+    """
+    def __init__(self, ancho_medida=320, factor_umbral=0.4, suavizado=0.05, max_omitidos_seguidos=10,
+                 brillo_minimo=20, brillo_maximo=235, contraste_minimo=12):
+        self.ancho_medida = ancho_medida  # Ancho de la copia reducida sobre la que se mide
+        self.factor_umbral = factor_umbral  # Fracción de la nitidez típica por debajo de la que se omite
+        self.suavizado = suavizado  # Peso de cada nueva medida en la media móvil exponencial
+        self.max_omitidos_seguidos = max_omitidos_seguidos  # Tras N omitidos se intenta uno (el umbral se recupera)
+        self.brillo_minimo = brillo_minimo
+        self.brillo_maximo = brillo_maximo
+        self.contraste_minimo = contraste_minimo
+
+        self.nitidez_tipica = None  # Media de la nitidez de los fotogramas decodificados con éxito
+        self.ultima_nitidez = 0.0
+        self.aceptados = 0
+        self.omitidos = 0
+        self.omitidos_seguidos = 0
+
+    def medir(self, imagen):
+        """
+        Función que devuelve (nitidez, brillo, contraste) de una imagen en grises o en color.
+        """
+        if imagen.shape[1] > self.ancho_medida:
+            escala = self.ancho_medida / imagen.shape[1]
+            imagen = cv2.resize(imagen, None, fx=escala, fy=escala, interpolation=cv2.INTER_AREA)
+        if imagen.ndim == 3:
+            imagen = cv2.cvtColor(imagen, cv2.COLOR_BGR2GRAY)
+        media, desviacion = cv2.meanStdDev(imagen)
+        _, desviacion_laplaciano = cv2.meanStdDev(cv2.Laplacian(imagen, cv2.CV_16S))
+        return float(desviacion_laplaciano[0, 0]) ** 2, float(media[0, 0]), float(desviacion[0, 0])
+
+    def umbral(self):
+        if self.nitidez_tipica is None:
+            return 0.0
+        return self.factor_umbral * self.nitidez_tipica
+
+    def aceptar(self, imagen):
+        """
+        Función que devuelve True si hay que decodificar el fotograma.
+        """
+        nitidez, brillo, contraste = self.medir(imagen)
+        self.ultima_nitidez = nitidez
+        valido = (nitidez >= self.umbral() and self.brillo_minimo <= brillo <= self.brillo_maximo
+                  and contraste >= self.contraste_minimo)
+        if not valido and self.omitidos_seguidos < self.max_omitidos_seguidos:
+            self.omitidos += 1
+            self.omitidos_seguidos += 1
+            return False
+        self.aceptados += 1
+        self.omitidos_seguidos = 0
+        return True
+
+    def informar(self, exito):
+        """
+        Función para comunicar si el último fotograma aceptado se decodificó; sólo los éxitos mueven el umbral.
+        """
+        if not exito:
+            return
+        if self.nitidez_tipica is None:
+            self.nitidez_tipica = self.ultima_nitidez
+        else:
+            self.nitidez_tipica += self.suavizado * (self.ultima_nitidez - self.nitidez_tipica)
+
+    def tasa_omitidos(self):
+        total = self.aceptados + self.omitidos
+        return self.omitidos / total if total else 0.0
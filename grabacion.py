@@ -0,0 +1,94 @@
+# ######################################################################################################
+#                                     Proyecto de Localización de Drones
+# Módulo de grabación y reproducción
+#
+# Descripción:
+# Guarda los fotogramas en bruto de la cámara (PNG sin pérdidas) junto con su marca de tiempo y su número
+# de secuencia, y permite reproducir después la grabación fotograma a fotograma. La escritura se hace en
+# un hilo aparte para no frenar el bucle de visión. La cola se limita en bytes y no en fotogramas, para que
+# la memoria reservada no dependa de la resolución; si se llena, el fotograma se descarta y se cuenta.
+# ######################################################################################################
+
+import csv
+import os
+import queue
+import threading
+
+import cv2
+
+from captura import FrameCapturado
+
+NOMBRE_INDICE = 'indice.csv'
+
+
+class GrabadorFrames:
+    """
+    Clase que escribe los fotogramas capturados en una carpeta con un índice CSV de marcas de tiempo.
+    """
+    def __init__(self, ruta, memoria_maxima=64 * 1024 * 1024, compresion_png=1):
+        self.ruta = ruta
+        self.memoria_maxima = memoria_maxima  # Bytes de fotogramas pendientes de escribir (unos 70 a 640x480)
+        self.compresion_png = compresion_png
+        self.grabados = 0
+        self.descartados = 0
+        os.makedirs(ruta, exist_ok=True)
+        self._cola = queue.Queue()
+        self._bytes_en_cola = 0
+        self._cerrojo = threading.Lock()
+        self._indice = open(os.path.join(ruta, NOMBRE_INDICE), 'w', newline='', encoding='utf-8')
+        self._escritor = csv.writer(self._indice)
+        self._escritor.writerow(['secuencia', 'marca_tiempo', 'fichero'])
+        self._hilo = threading.Thread(target=self._bucle_escritura, name='GrabadorFrames', daemon=True)
+        self._hilo.start()
+
+    def grabar(self, capturado):
+        """
+        Función para encolar un FrameCapturado sin bloquear. Devuelve False si se ha descartado.
+        Se guarda una copia porque el bucle principal dibuja después sobre el mismo fotograma.
+        """
+        with self._cerrojo:
+            if self._bytes_en_cola + capturado.frame.nbytes > self.memoria_maxima:
+                self.descartados += 1
+                return False
+            self._bytes_en_cola += capturado.frame.nbytes
+        self._cola.put(capturado._replace(frame=capturado.frame.copy()))
+        return True
+
+    def _bucle_escritura(self):
+        while True:
+            capturado = self._cola.get()
+            if capturado is None:
+                break
+            fichero = f'{capturado.secuencia:08d}.png'
+            cv2.imwrite(os.path.join(self.ruta, fichero), capturado.frame,
+                        [cv2.IMWRITE_PNG_COMPRESSION, self.compresion_png])
+            self._escritor.writerow([capturado.secuencia, f'{capturado.marca_tiempo:.6f}', fichero])
+            self.grabados += 1
+            with self._cerrojo:
+                self._bytes_en_cola -= capturado.frame.nbytes
+
+    def cerrar(self):
+        """
+        Función para terminar de escribir los fotogramas pendientes y cerrar el índice.
+        """
+        self._cola.put(None)
+        self._hilo.join()
+        self._indice.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.cerrar()
+
+
+def leer_grabacion(ruta):
+    """
+    Función generadora que devuelve los FrameCapturado de una grabación en orden.
+    """
+    with open(os.path.join(ruta, NOMBRE_INDICE), newline='', encoding='utf-8') as fichero:
+        for fila in csv.DictReader(fichero):
+            frame = cv2.imread(os.path.join(ruta, fila['fichero']), cv2.IMREAD_UNCHANGED)
+            if frame is None:
+                continue
+            yield FrameCapturado(frame, float(fila['marca_tiempo']), int(fila['secuencia']))
@@ -0,0 +1,142 @@
+# ######################################################################################################
+#                                     Proyecto de Localización de Drones
+# Módulo de instrumentación del bucle de localización
+#
+# Descripción:
+# Sondas de tiempo ligeras alrededor de cada etapa (captura, decodificación, geometría, anotación,
+# imshow/waitKey...), con histogramas deslizantes (p50/p95/p99) y contadores de fotogramas descartados o
+# sin decodificar. Se puede sacar un resumen periódico en líneas JSON o dibujarlo en pantalla. Cuando está
+# desactivada, cada sonda es un contexto vacío compartido y el coste es despreciable.
+# ######################################################################################################
+
+import json
+import sys
+import time
+from collections import defaultdict, deque
+from contextlib import nullcontext
+
+import cv2
+import numpy as np
+
+_SONDA_VACIA = nullcontext()
+
+
+class _Sonda:
+    __slots__ = ('instrumentacion', 'etapa', 'inicio')
+
+    def __init__(self, instrumentacion, etapa):
+        self.instrumentacion = instrumentacion
+        self.etapa = etapa
+        self.inicio = 0.0
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.instrumentacion.registrar(self.etapa, time.perf_counter() - self.inicio)
+
+
+class Instrumentacion:
+    """
+    Clase que guarda los tiempos de las últimas `ventana` ejecuciones de cada etapa y los contadores.
+    """
+    def __init__(self, activa=True, ventana=300):
+        self.activa = activa
+        self.ventana = ventana
+        self.tiempos = defaultdict(lambda: deque(maxlen=self.ventana))
+        self.contadores = defaultdict(int)
+        self.fotograma = {}  # Tiempo acumulado por etapa desde la última llamada a nuevo_fotograma()
+
+    def medir(self, etapa):
+        """
+        Función que devuelve un contexto que mide lo que tarda el bloque y lo añade a la etapa.
+        """
+        if not self.activa:
+            return _SONDA_VACIA
+        return _Sonda(self, etapa)
+
+    def registrar(self, etapa, segundos):
+        """
+        Función para añadir una duración ya medida a una etapa.
+        """
+        if self.activa:
+            self.tiempos[etapa].append(segundos)
+            self.fotograma[etapa] = self.fotograma.get(etapa, 0.0) + segundos
+
+    def nuevo_fotograma(self):
+        """
+        Función que devuelve los tiempos por etapa acumulados en el fotograma anterior y empieza otro.
+        """
+        tiempos, self.fotograma = self.fotograma, {}
+        return tiempos
+
+    def contar(self, contador, cantidad=1):
+        if self.activa:
+            self.contadores[contador] += cantidad
+
+    def resumen(self):
+        """
+        Función que devuelve los percentiles (en ms) de cada etapa y los contadores acumulados.
+        """
+        etapas = {}
+        for etapa, muestras in list(self.tiempos.items()):
+            if not muestras:
+                continue
+            p50, p95, p99 = np.percentile(np.array(muestras) * 1000, [50, 95, 99])
+            etapas[etapa] = {'n': len(muestras), 'p50_ms': float(p50), 'p95_ms': float(p95), 'p99_ms': float(p99)}
+        return {'marca_tiempo': time.time(), 'etapas': etapas, 'contadores': dict(self.contadores)}
+
+
+class ResumenPeriodico:
+    """
+    Clase que escribe el resumen de la instrumentación como una línea JSON cada `periodo` segundos.
+    """
+    def __init__(self, instrumentacion, periodo=5.0, ruta=None):
+        self.instrumentacion = instrumentacion
+        self.periodo = periodo
+        self._salida = open(ruta, 'a', encoding='utf-8') if ruta else sys.stderr
+        self._ultimo = time.monotonic()
+        self.ultimo_resumen = None
+
+    def tick(self):
+        """
+        Función que se llama una vez por fotograma; devuelve el resumen cuando toca emitirlo.
+        """
+        if not self.instrumentacion.activa:
+            return None
+        ahora = time.monotonic()
+        if ahora - self._ultimo < self.periodo:
+            return None
+        self._ultimo = ahora
+        self.ultimo_resumen = self.instrumentacion.resumen()
+        self._salida.write(json.dumps(self.ultimo_resumen, separators=(',', ':')) + '\n')
+        self._salida.flush()
+        return self.ultimo_resumen
+
+    def emitir(self, datos):
+        """
+        Función para escribir un registro puntual (por ejemplo, los tiempos de arranque) en la misma salida.
+        """
+        self._salida.write(json.dumps(datos, separators=(',', ':')) + '\n')
+        self._salida.flush()
+
+    def cerrar(self):
+        if self._salida is not sys.stderr:
+            self._salida.close()
+
+
+def dibujar_panel(frame, resumen, fuente, tamaño_fuente, color, grosor, origen=(10, 80)):
+    """
+    Función para dibujar en el fotograma un panel con los p50/p95 de cada etapa y los contadores.
+    """
+    if not resumen:
+        return
+    x, y = origen
+    lineas = [f"{etapa}: p50 {datos['p50_ms']:.1f} / p95 {datos['p95_ms']:.1f} ms"
+              for etapa, datos in resumen['etapas'].items()]
+    lineas += [f"{contador}: {valor}" for contador, valor in resumen['contadores'].items()]
+    for linea in lineas:
+        cv2.putText(frame, linea, (x, y), fuente, tamaño_fuente, (0, 0, 0), grosor + 2, cv2.LINE_AA)
+        cv2.putText(frame, linea, (x, y), fuente, tamaño_fuente, color, grosor, cv2.LINE_AA)
+        y += 18
@@ -0,0 +1,110 @@
+# ######################################################################################################
+#                                     Proyecto de Localización de Drones
+# Módulo del mapa de marcadores
+#
+# Descripción:
+# El mapa de marcadores es un fichero CSV (id,lado_cm,x_m,y_m) que asocia un ID entero compacto con la
+# posición y el lado de cada marcador. Así los códigos QR sólo necesitan llevar el ID: el contenido es
+# más corto, el QR puede ser de una versión menor con módulos más grandes (se decodifica antes y desde más
+# altura) y desaparece el parseo de texto en cada fotograma, porque el mapa se carga una sola vez en un
+# índice en memoria y cada contenido ya interpretado se memoriza.
+# ######################################################################################################
+
+import csv
+import os
+
+CABECERA = ['id', 'lado_cm', 'x_m', 'y_m']
+
+
+def extraer_valores_desde_qr(texto_qr):
+    """
+    Función para extraer los valores (longitud, coordenadas X e Y) desde un código QR.
+    """
+    try:
+        valores = texto_qr.split(',')
+        longitud = float(valores[0])
+        x = float(valores[1])
+        y = float(valores[2])
+        return longitud, x, y
+    except Exception as e:
+        print(f"Error al extraer los valores: {e}")
+        return None, None, None
+
+
+class MapaMarcadores:
+    """
+    Clase que mantiene el índice en memoria ID -> (lado_cm, x_m, y_m) de los marcadores.
+    """
+    def __init__(self, marcadores=None):
+        self.indice = {}
+        self._cache = {}
+        for id_marcador, (lado, x, y) in (marcadores or {}).items():
+            self.agregar(id_marcador, lado, x, y)
+
+    @classmethod
+    def cargar(cls, ruta):
+        """
+        Función para leer un mapa desde un fichero CSV. Si el fichero no existe se devuelve un mapa vacío.
+        """
+        mapa = cls()
+        if not os.path.exists(ruta):
+            return mapa
+        with open(ruta, newline='', encoding='utf-8') as fichero:
+            for fila in csv.DictReader(fichero):
+                mapa.agregar(int(fila['id']), float(fila['lado_cm']), float(fila['x_m']), float(fila['y_m']))
+        return mapa
+
+    def guardar(self, ruta):
+        """
+        Función para escribir el mapa en un fichero CSV, ordenado por ID.
+        """
+        with open(ruta, 'w', newline='', encoding='utf-8') as fichero:
+            escritor = csv.writer(fichero)
+            escritor.writerow(CABECERA)
+            for id_marcador in sorted(self.indice):
+                lado, x, y = self.indice[id_marcador]
+                escritor.writerow([id_marcador, f'{lado:g}', f'{x:g}', f'{y:g}'])
+
+    def agregar(self, id_marcador, lado, x, y):
+        """
+        Función para añadir (o sustituir) un marcador en el índice.
+        """
+        self.indice[int(id_marcador)] = (float(lado), float(x), float(y))
+        self._cache.clear()
+
+    def registrar(self, lado, x, y):
+        """
+        Función para obtener el ID del marcador con ese lado y posición, creándolo si no existe.
+        """
+        valores = (float(lado), float(x), float(y))
+        for id_marcador, existentes in self.indice.items():
+            if existentes == valores:
+                return id_marcador
+        id_marcador = self.siguiente_id()
+        self.agregar(id_marcador, *valores)
+        return id_marcador
+
+    def siguiente_id(self):
+        return max(self.indice, default=-1) + 1
+
+    def valores(self, texto):
+        """
+        Función para obtener (longitud, x, y) a partir del contenido de un marcador: un ID del mapa o,
+        para los QR antiguos, el texto "lado,x,y". El resultado se memoriza por contenido.
+        """
+        try:
+            return self._cache[texto]
+        except KeyError:
+            pass
+        if texto.isdigit():
+            valores = self.indice.get(int(texto), (None, None, None))
+        else:
+            valores = extraer_valores_desde_qr(texto)
+        self._cache[texto] = valores
+        return valores
+
+    def __len__(self):
+        return len(self.indice)
+
+    def __iter__(self):
+        return iter(sorted(self.indice))
@@ -0,0 +1,201 @@
+# ######################################################################################################
+#                                     Proyecto de Localización de Drones
+# Módulo de localización con varias cámaras
+#
+# Descripción:
+# Cada cámara tiene su propio hilo de captura y su propio DetectorQR (con sus parámetros intrínsecos y
+# su estado de seguimiento), y se procesa en un hilo independiente: OpenCV y zbar liberan el GIL mientras
+# decodifican, así que las cámaras no se serializan en un único bucle. Las poses más recientes de todas
+# las cámaras se fusionan en una sola, ponderadas por su calidad.
+#
+# Uso:
+#   python multi_camara.py 0 1 --backend aruco --desplazamientos 0,0,0 0.05,0,0 --destino udp://127.0.0.1:5005
+# ######################################################################################################
+
+import argparse
+import threading
+import time
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+from backends_fiduciales import crear_backend
+from calibracion_camara import CalibracionCamara
+from captura import CapturaHilo, FrameCapturado
+from detector_qr import DetectorQR
+from mapa_marcadores import MapaMarcadores
+from salida_pose import PublicadorPose, registro_pose
+
+PoseCamara = namedtuple('PoseCamara', ['nombre', 'marca_tiempo', 'secuencia', 'coordenadas_dron', 'calidad',
+                                       'num_qr'])
+
+
+class CamaraLocalizacion:
+    """
+    Clase que lee una cámara y calcula la pose del dron con su propio detector en un hilo aparte.
+    `desplazamiento` es la posición (x, y, z) en metros de la cámara respecto al centro del dron, en los
+    ejes del dron (con guiñada 0 coinciden con los del mapa).
+    """
+    def __init__(self, fuente_video, detector, desplazamiento=(0.0, 0.0, 0.0), nombre=None):
+        self.fuente_video = fuente_video
+        self.detector = detector
+        self.desplazamiento = np.asarray(desplazamiento, dtype=np.float64)
+        self.nombre = nombre if nombre is not None else f'camara_{fuente_video}'
+        self.ultima_pose = None
+        self.frames_procesados = 0
+        self._cerrojo = threading.Lock()
+        self._activo = threading.Event()
+        self._cap = None
+        self._captura = None
+        self._hilo = None
+
+    def iniciar(self):
+        """
+        Función para abrir la cámara y arrancar sus hilos de captura y de detección.
+        """
+        self._cap = cv2.VideoCapture(self.fuente_video)
+        self._captura = CapturaHilo(self._cap).iniciar()
+        self._activo.set()
+        self._hilo = threading.Thread(target=self._bucle_deteccion, name=f'Detector-{self.nombre}', daemon=True)
+        self._hilo.start()
+        return self
+
+    def _bucle_deteccion(self):
+        while self._activo.is_set():
+            capturado, _ = self._captura.leer(timeout=0.5)
+            if capturado is None:
+                continue
+            objetos, _, coordenadas_dron, calidad = self.detector.encontrar_codigos_qr(capturado.frame, dibujar=False)
+            self.frames_procesados += 1
+            if coordenadas_dron is None:
+                continue
+            # El desplazamiento va en ejes del dron: se gira con la guiñada antes de restarlo en ejes del mapa
+            guiñada = self.detector.ultima_orientacion[0] if self.detector.ultima_orientacion is not None else 0.0
+            coseno, seno = np.cos(guiñada), np.sin(guiñada)
+            dx, dy, dz = self.desplazamiento
+            desplazamiento = np.array([dx * coseno - dy * seno, dx * seno + dy * coseno, dz])
+            coordenadas_dron = tuple(float(v) for v in np.asarray(coordenadas_dron) - desplazamiento)
+            with self._cerrojo:
+                self.ultima_pose = PoseCamara(self.nombre, capturado.marca_tiempo, capturado.secuencia,
+                                              coordenadas_dron, calidad, len(objetos))
+
+    def pose(self):
+        with self._cerrojo:
+            return self.ultima_pose
+
+    def detener(self):
+        """
+        Función para parar los hilos y liberar la cámara.
+        """
+        self._activo.clear()
+        if self._hilo is not None:
+            self._hilo.join(timeout=2.0)
+            self._hilo = None
+        if self._captura is not None:
+            self._captura.detener()
+        if self._cap is not None:
+            self._cap.release()
+
+
+def fusionar_poses(poses):
+    """
+    Función para combinar las poses de varias cámaras en una sola, ponderadas por su calidad.
+    La calidad combinada es la probabilidad de que al menos una de las estimaciones sea buena.
+    """
+    if not poses:
+        return None, 0.0
+    coordenadas = np.array([pose.coordenadas_dron for pose in poses], dtype=np.float64)
+    calidades = np.array([pose.calidad for pose in poses], dtype=np.float64)
+    pesos = calidades if calidades.sum() > 0 else np.ones_like(calidades)
+    posicion = np.average(coordenadas, axis=0, weights=pesos)
+    calidad = 1.0 - np.prod(1.0 - np.clip(calidades, 0.0, 1.0))
+    return tuple(float(v) for v in posicion), float(calidad)
+
+
+class EjecutorMultiCamara:
+    """
+    Clase que arranca varias CamaraLocalizacion y fusiona sus poses recientes.
+    """
+    def __init__(self, camaras, antiguedad_maxima=0.2):
+        self.camaras = list(camaras)
+        self.antiguedad_maxima = antiguedad_maxima
+
+    def iniciar(self):
+        for camara in self.camaras:
+            camara.iniciar()
+        return self
+
+    def detener(self):
+        for camara in self.camaras:
+            camara.detener()
+
+    def pose_fusionada(self):
+        """
+        Función que devuelve (coordenadas_dron, calidad, marca_tiempo, num_qr) a partir de las poses de
+        las cámaras que no superan la antigüedad máxima, o None si no hay ninguna.
+        """
+        ahora = time.monotonic()
+        poses = [pose for pose in (camara.pose() for camara in self.camaras)
+                 if pose is not None and ahora - pose.marca_tiempo <= self.antiguedad_maxima]
+        if not poses:
+            return None
+        coordenadas_dron, calidad = fusionar_poses(poses)
+        return coordenadas_dron, calidad, max(pose.marca_tiempo for pose in poses), sum(p.num_qr for p in poses)
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *args):
+        self.detener()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Localización con varias cámaras')
+    parser.add_argument('fuentes', nargs='+', help='Cámaras (índice de dispositivo o URL)')
+    parser.add_argument('--backend', default='pyzbar', choices=['pyzbar', 'opencv_qr', 'aruco'])
+    parser.add_argument('--mapa', default='mapa_marcadores.csv', help='Mapa de marcadores')
+    parser.add_argument('--angulos', nargs='*', type=float,
+                        help='Ángulo de visión vertical (rad) de cada cámara, si no hay calibración')
+    parser.add_argument('--calibraciones', nargs='*', help='Fichero de calibración de cada cámara')
+    parser.add_argument('--desplazamientos', nargs='*', help='Posición x,y,z (m) de cada cámara en el dron')
+    parser.add_argument('--destino', default='stdout', help='Destino de la pose (stdout, udp://..., unix://...)')
+    parser.add_argument('--frecuencia', type=float, default=30.0, help='Poses fusionadas por segundo')
+    args = parser.parse_args()
+
+    mapa = MapaMarcadores.cargar(args.mapa)
+    camaras = []
+    for i, fuente_video in enumerate(args.fuentes):
+        fuente_video = int(fuente_video) if fuente_video.isdigit() else fuente_video
+        angulo = args.angulos[i] if args.angulos and i < len(args.angulos) else 0.74
+        desplazamiento = (tuple(float(v) for v in args.desplazamientos[i].split(','))
+                          if args.desplazamientos and i < len(args.desplazamientos) else (0.0, 0.0, 0.0))
+        calibracion = (CalibracionCamara.cargar(args.calibraciones[i])
+                       if args.calibraciones and i < len(args.calibraciones) else None)
+        detector = DetectorQR(850.0, 200.0, modo_seguimiento=True, dibujar=False,
+                              backend=crear_backend(args.backend), mapa=mapa, angulo_de_vision=angulo,
+                              calibracion=calibracion)
+        camaras.append(CamaraLocalizacion(fuente_video, detector, desplazamiento))
+
+    publicador = PublicadorPose(args.destino)
+    secuencia = 0
+    ultima_marca = None
+    with EjecutorMultiCamara(camaras) as ejecutor:
+        try:
+            while True:
+                time.sleep(1.0 / args.frecuencia)
+                fusion = ejecutor.pose_fusionada()
+                # Sólo se publica cuando alguna cámara ha aportado una pose nueva
+                if fusion is None or fusion[2] == ultima_marca:
+                    continue
+                coordenadas_dron, calidad, ultima_marca, num_qr = fusion
+                secuencia += 1
+                publicador.publicar(registro_pose(FrameCapturado(None, ultima_marca, secuencia), coordenadas_dron,
+                                                  num_qr, calidad))
+        except KeyboardInterrupt:
+            pass
+    publicador.cerrar()
+
+
+if __name__ == "__main__":
+    main()
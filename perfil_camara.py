@@ -0,0 +1,158 @@
+# ######################################################################################################
+#                                     Proyecto de Localización de Drones
+# Módulo del perfil de arranque de la cámara
+#
+# Descripción:
+# Guarda la última configuración de la cámara con la que se obtuvo una pose (backend de vídeo,
+# resolución, formato, enfoque y nivel del planificador) junto con la firma del fichero de calibración.
+# Al volver a arrancar, la cámara se abre directamente con ese backend y esa configuración, sin que
+# OpenCV pruebe backends ni renegocie el formato, y el enfoque parte de la última posición en lugar de
+# barrer todo el recorrido. Si la cámara, la fuente o la calibración han cambiado, el perfil se ignora.
+# También mide el tiempo desde que arrancó el proceso, para informar del tiempo hasta la primera pose.
+# ######################################################################################################
+
+import json
+import os
+import time
+
+import cv2
+
+RUTA_PERFIL = 'perfil_camara.json'
+
+_INICIO_MODULO = time.monotonic()
+
+
+def segundos_desde_inicio():
+    """
+    Función que devuelve los segundos desde que arrancó el proceso (incluida la importación de
+    OpenCV y NumPy). En Linux se usa el instante de arranque que da /proc; si no, el de este módulo.
+    """
+    try:
+        with open('/proc/self/stat', encoding='ascii') as fichero:
+            campos = fichero.read().rsplit(')', 1)[1].split()
+        inicio = int(campos[19]) / os.sysconf('SC_CLK_TCK')  # starttime, en ticks desde el arranque del sistema
+        return time.clock_gettime(time.CLOCK_BOOTTIME) - inicio
+    except (OSError, ValueError, IndexError, AttributeError):
+        return time.monotonic() - _INICIO_MODULO
+
+
+def firma_fichero(ruta):
+    """
+    Función que identifica una versión de un fichero por su fecha de modificación y tamaño.
+    """
+    if not ruta or not os.path.exists(ruta):
+        return None
+    estado = os.stat(ruta)
+    return [estado.st_mtime_ns, estado.st_size]
+
+
+def nombre_backend(cap):
+    """
+    Función que devuelve el backend de vídeo con el que se abrió la cámara ('V4L2', 'GSTREAMER'...).
+    """
+    try:
+        return cap.getBackendName()
+    except cv2.error:
+        return None
+
+
+def fourcc_a_texto(valor):
+    valor = int(valor)
+    texto = ''.join(chr((valor >> 8 * i) & 0xFF) for i in range(4))
+    return texto if valor and texto.isprintable() else None
+
+
+class PerfilCamara:
+    """
+    Clase con la configuración de la cámara que se reaplica al arrancar.
+    """
+    def __init__(self, fuente, backend=None, resolucion=None, fourcc=None, fps=None, enfoque=None,
+                 nivel_planificador=None, calibracion=None):
+        self.fuente = fuente
+        self.backend = backend
+        self.resolucion = tuple(resolucion) if resolucion is not None else None  # (ancho, alto)
+        self.fourcc = fourcc
+        self.fps = fps
+        self.enfoque = enfoque
+        self.nivel_planificador = nivel_planificador
+        self.calibracion = calibracion  # {'ruta': ..., 'firma': [mtime_ns, tamaño]}
+
+    @classmethod
+    def cargar(cls, ruta=RUTA_PERFIL):
+        """
+        Función para leer el perfil guardado. Devuelve None si no existe o no se puede leer.
+        """
+        if not ruta or not os.path.exists(ruta):
+            return None
+        try:
+            with open(ruta, encoding='utf-8') as fichero:
+                return cls(**json.load(fichero))
+        except (ValueError, TypeError):
+            return None
+
+    def guardar(self, ruta=RUTA_PERFIL):
+        """
+        Función para escribir el perfil. Se escribe en un fichero temporal y se renombra, para que un
+        reinicio a mitad de la escritura nunca deje un perfil a medias.
+        """
+        temporal = ruta + '.tmp'
+        with open(temporal, 'w', encoding='utf-8') as fichero:
+            json.dump({'fuente': self.fuente, 'backend': self.backend,
+                       'resolucion': list(self.resolucion) if self.resolucion else None, 'fourcc': self.fourcc,
+                       'fps': self.fps, 'enfoque': self.enfoque, 'nivel_planificador': self.nivel_planificador,
+                       'calibracion': self.calibracion}, fichero, indent=2)
+        os.replace(temporal, ruta)
+
+    def compatible(self, fuente, ruta_calibracion):
+        """
+        Función que dice si el perfil se guardó para la misma fuente y la misma calibración.
+        """
+        calibracion = {'ruta': ruta_calibracion, 'firma': firma_fichero(ruta_calibracion)}
+        return self.fuente == fuente and self.calibracion == calibracion
+
+    def abrir(self):
+        """
+        Función para abrir la cámara con el backend guardado y aplicarle la configuración antes de la
+        primera lectura.
+        """
+        api = getattr(cv2, f'CAP_{self.backend}', cv2.CAP_ANY) if self.backend else cv2.CAP_ANY
+        cap = cv2.VideoCapture(self.fuente, api)
+        if self.fourcc:
+            cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*self.fourcc))
+        if self.resolucion:
+            cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.resolucion[0])
+            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.resolucion[1])
+        if self.fps:
+            cap.set(cv2.CAP_PROP_FPS, self.fps)
+        if self.enfoque is not None:
+            # El enfoque se coloca en la última posición buena; si después se activa el autoenfoque,
+            # parte de ahí en lugar de barrer todo el recorrido
+            cap.set(cv2.CAP_PROP_AUTOFOCUS, 0)
+            cap.set(cv2.CAP_PROP_FOCUS, self.enfoque)
+        return cap
+
+    @classmethod
+    def desde_estado(cls, fuente, backend, forma_frame, fourcc, nivel_planificador, ruta_calibracion, anterior=None):
+        """
+        Función para crear el perfil a partir de lo que ya sabe el bucle, sin consultar la cámara (que
+        sólo puede usar el hilo de captura). El fps y el enfoque se conservan del perfil anterior.
+        """
+        return cls(fuente, backend, (forma_frame[1], forma_frame[0]), fourcc,
+                   anterior.fps if anterior is not None else None,
+                   anterior.enfoque if anterior is not None else None,
+                   nivel_planificador, {'ruta': ruta_calibracion, 'firma': firma_fichero(ruta_calibracion)})
+
+    def actualizar_desde_captura(self, cap):
+        """
+        Función para leer la configuración final de la cámara cuando el hilo de captura ya está parado
+        (el planificador puede haber cambiado la resolución y el formato desde la primera pose).
+        """
+        ancho, alto = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        enfoque = cap.get(cv2.CAP_PROP_FOCUS)
+        fourcc = fourcc_a_texto(cap.get(cv2.CAP_PROP_FOURCC))
+        self.resolucion = (ancho, alto) if ancho > 0 and alto > 0 else self.resolucion
+        self.fps = fps if fps > 0 else self.fps
+        self.enfoque = enfoque if enfoque >= 0 else self.enfoque
+        self.fourcc = fourcc or self.fourcc
+        return self
@@ -0,0 +1,119 @@
+# ######################################################################################################
+#                                     Proyecto de Localización de Drones
+# Módulo del planificador por presupuesto de latencia
+#
+# Descripción:
+# Vigila la latencia medida de cada pose (desde la captura hasta el resultado) frente a un presupuesto y
+# mueve en tiempo de ejecución el nivel de calidad: resolución y formato de captura (MJPG o YUYV) y
+# escalas de decodificación. Baja de nivel en cuanto el p95 de una ventana se pasa del presupuesto, o la
+# tasa de poses cae por debajo de la mínima mientras se pierden fotogramas por no dar abasto (si es la
+# cámara la que no da más, bajar de nivel no serviría). Sólo sube cuando hay margen durante varias
+# ventanas seguidas. Tras cada cambio se ignora una ventana, porque reconfigurar la
+# cámara produce un pico de latencia que no representa al nivel nuevo.
+# ######################################################################################################
+
+import time
+from collections import namedtuple
+
+import numpy as np
+
+NivelCalidad = namedtuple('NivelCalidad', ['resolucion', 'fourcc', 'escalas_decodificacion'])
+
+# Del más barato al más caro. MJPG ahorra ancho de banda USB pero hay que descomprimirlo; YUYV llega sin
+# artefactos de compresión, que ayudan a decodificar QR pequeños. Se decodifican todos los fotogramas en
+# todos los niveles: la captura siempre entrega el más reciente, así que saltarse uno no baja la latencia
+NIVELES_POR_DEFECTO = (
+    NivelCalidad((320, 240), 'MJPG', (1.0,)),
+    NivelCalidad((640, 480), 'MJPG', (0.5,)),
+    NivelCalidad((640, 480), 'MJPG', (0.5, 1.0)),
+    NivelCalidad((640, 480), 'YUYV', (0.5, 1.0)),
+    NivelCalidad((1280, 720), 'MJPG', (0.5, 1.0)),
+)
+
+
+class PlanificadorLatencia:
+    """
+    Clase que elige el nivel de calidad según la latencia de las últimas poses.
+    """
+    def __init__(self, niveles=NIVELES_POR_DEFECTO, presupuesto=0.1, frecuencia_minima=10.0, nivel_inicial=1,
+                 ventana=30, margen_subida=0.6, ventanas_para_subir=3, instrumentacion=None):
+        self.niveles = tuple(niveles)
+        self.presupuesto = presupuesto  # Segundos de latencia p95 permitidos por pose
+        self.frecuencia_minima = frecuencia_minima  # Poses por segundo por debajo de las que se baja de nivel
+        self.indice = max(0, min(len(self.niveles) - 1, nivel_inicial))
+        self.ventana = ventana
+        self.margen_subida = margen_subida  # Fracción del presupuesto por debajo de la que hay margen para subir
+        self.ventanas_para_subir = ventanas_para_subir
+        self.instrumentacion = instrumentacion
+        self.cambios = 0
+        self._latencias = []
+        self._marcas = []
+        self._ventanas_con_margen = 0
+        self._ignorar_ventana = False
+        self._descartados = 0  # Fotogramas de la ventana que no se llegaron a decodificar
+
+    @property
+    def nivel(self):
+        return self.niveles[self.indice]
+
+    def forma_maxima(self, canales=3):
+        """
+        Función que devuelve la forma del mayor fotograma que pueden producir los niveles (para el pool).
+        """
+        ancho = max(nivel.resolucion[0] for nivel in self.niveles)
+        alto = max(nivel.resolucion[1] for nivel in self.niveles)
+        return (alto, ancho, canales)
+
+    def contar_descartados(self, cantidad=1):
+        """
+        Función para anotar fotogramas capturados que no se decodificaron por no dar abasto (la captura
+        los sustituyó por otro más nuevo o el pool no tenía hueco).
+        """
+        self._descartados += cantidad
+
+    def registrar(self, marca_tiempo_captura, ahora=None):
+        """
+        Función para añadir la latencia de una pose. Devuelve el NivelCalidad nuevo si hay que cambiar.
+        """
+        ahora = time.monotonic() if ahora is None else ahora
+        latencia = ahora - marca_tiempo_captura
+        self._latencias.append(latencia)
+        self._marcas.append(ahora)
+        if self.instrumentacion is not None:
+            self.instrumentacion.registrar('latencia_pose', latencia)
+        if len(self._latencias) < self.ventana:
+            return None
+
+        p95 = float(np.percentile(self._latencias, 95))
+        duracion = self._marcas[-1] - self._marcas[0]
+        frecuencia = (len(self._marcas) - 1) / duracion if duracion > 0 else float('inf')
+        descartados = self._descartados
+        self._latencias, self._marcas, self._descartados = [], [], 0
+        if self._ignorar_ventana:
+            self._ignorar_ventana = False
+            return None
+
+        # Una tasa baja sólo se corrige bajando de nivel si se pierden fotogramas; si se decodifican todos,
+        # es la cámara la que no da más y no debe impedir que se suba con margen de latencia
+        if p95 > self.presupuesto or (frecuencia < self.frecuencia_minima and descartados > 0):
+            self._ventanas_con_margen = 0
+            return self._cambiar(-1)
+        if p95 < self.presupuesto * self.margen_subida:
+            self._ventanas_con_margen += 1
+            if self._ventanas_con_margen >= self.ventanas_para_subir:
+                self._ventanas_con_margen = 0
+                return self._cambiar(1)
+        else:
+            self._ventanas_con_margen = 0
+        return None
+
+    def _cambiar(self, paso):
+        indice = max(0, min(len(self.niveles) - 1, self.indice + paso))
+        if indice == self.indice:
+            return None
+        self.indice = indice
+        self.cambios += 1
+        self._ignorar_ventana = True
+        if self.instrumentacion is not None:
+            self.instrumentacion.contar('cambios_nivel')
+        return self.nivel
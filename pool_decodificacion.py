@@ -0,0 +1,223 @@
+# ######################################################################################################
+#                                     Proyecto de Localización de Drones
+# Módulo del pool de decodificación en varios núcleos
+#
+# Descripción:
+# Reparte la decodificación entre varios procesos trabajadores, cada uno con su propio DetectorQR. Los
+# fotogramas se copian una sola vez a huecos de `multiprocessing.shared_memory` y por las colas sólo viaja
+# el índice del hueco, sin serializar imágenes. Los resultados se reordenan por número de secuencia antes
+# de entregarlos, así que la pose sale en el orden de captura aunque los trabajadores terminen
+# desordenados. Si todos los huecos están ocupados el fotograma nuevo se descarta en lugar de esperar.
+# Si un trabajador falla con un fotograma devuelve un resultado vacío; si muere o se cuelga, su fotograma
+# se da por perdido pasado `tiempo_maximo` y se libera su hueco. Un proceso muerto puede dejar bloqueadas
+# las colas, así que entonces se vuelven a lanzar todos los trabajadores con colas nuevas.
+# Cada hueco tiene el tamaño del mayor fotograma admitido y la forma real viaja con la tarea, así que la
+# resolución de la cámara puede cambiar en marcha (planificador_latencia.py) sin recrear el pool.
+# Los trabajadores se lanzan con forkserver (spawn si no está disponible) y no con fork, porque el pool se
+# crea y se relanza cuando el programa ya tiene otros hilos en marcha.
+# ######################################################################################################
+
+import multiprocessing as mp
+import queue
+import time
+import traceback
+from collections import deque, namedtuple
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from backends_fiduciales import crear_backend
+from calibracion_camara import CalibracionCamara
+from detector_qr import DetectorQR
+from mapa_marcadores import MapaMarcadores
+
+ResultadoDecodificacion = namedtuple('ResultadoDecodificacion', [
+    'secuencia', 'marca_tiempo', 'frame', 'objetos_decodificados', 'coordenadas_dron', 'calidad', 'orientacion'])
+
+
+def _contexto_multiproceso():
+    # El pool se crea (y se relanza) con los hilos de captura, salida, vista previa, grabación y enlace serie
+    # ya en marcha: un fork copiaría los cerrojos que tuvieran tomados y el hijo podría quedarse bloqueado.
+    # forkserver hace los fork desde un proceso servidor sin hilos, que importa una sola vez los módulos
+    metodos = mp.get_all_start_methods()
+    return mp.get_context('forkserver' if 'forkserver' in metodos else 'spawn')
+
+
+def _vista_hueco(huecos, hueco, forma):
+    # Los primeros bytes del hueco vistos con la forma del fotograma que contiene
+    return huecos[hueco, :int(np.prod(forma))].reshape(forma)
+
+
+def _bucle_trabajador(nombre_memoria, forma, tipo, opciones_detector, backend, opciones_backend, ruta_mapa,
+                      ruta_calibracion, tareas, resultados):
+    # Cada trabajador ocupa un núcleo; los hilos internos de OpenCV sólo competirían entre sí
+    cv2.setNumThreads(1)
+    memoria = shared_memory.SharedMemory(name=nombre_memoria)
+    try:
+        huecos = np.ndarray(forma, dtype=tipo, buffer=memoria.buf)
+        mapa = MapaMarcadores.cargar(ruta_mapa) if ruta_mapa else None
+        detector = DetectorQR(**opciones_detector, backend=crear_backend(backend, **opciones_backend), mapa=mapa,
+                              calibracion=CalibracionCamara.cargar(ruta_calibracion))
+        ultima_secuencia = None
+        while True:
+            tarea = tareas.get()
+            if tarea is None:
+                break
+            hueco, forma_frame, secuencia, marca_tiempo, dibujar, escalas = tarea
+            if escalas is not None and escalas != detector.escalas_decodificacion:
+                detector.ajustar_escalas(escalas)
+            # Cada trabajador sólo ve algunos fotogramas: el seguimiento mide la velocidad por fotograma de
+            # la cámara y no por fotograma recibido
+            detector.paso_fotogramas = max(1, secuencia - ultima_secuencia) if ultima_secuencia is not None else 1
+            ultima_secuencia = secuencia
+            try:
+                objetos, _, coordenadas_dron, calidad = detector.encontrar_codigos_qr(
+                    _vista_hueco(huecos, hueco, forma_frame), dibujar)
+            except Exception:
+                # Un fallo con un fotograma no puede dejar sin resultado a su secuencia: se entrega vacío
+                traceback.print_exc()
+                objetos, coordenadas_dron, calidad = [], None, 0.0
+                detector.actualizar_seguimiento([])
+            orientacion = detector.ultima_orientacion if coordenadas_dron is not None else None
+            resultados.put((secuencia, marca_tiempo, hueco, forma_frame, objetos, coordenadas_dron, calidad,
+                            orientacion))
+    finally:
+        memoria.close()
+
+
+class PoolDecodificacion:
+    """
+    Clase que gestiona los procesos trabajadores, los huecos de memoria compartida y el reordenado.
+    `forma_frame` es la forma del mayor fotograma que se va a enviar.
+    """
+    def __init__(self, forma_frame, num_trabajadores=3, num_huecos=None, opciones_detector=None,
+                 backend='pyzbar', opciones_backend=None, ruta_mapa=None, ruta_calibracion=None, tipo=np.uint8,
+                 tiempo_maximo=1.0):
+        self.num_trabajadores = num_trabajadores
+        self.num_huecos = num_huecos or 2 * num_trabajadores
+        self.forma_frame = tuple(forma_frame)
+        self.tiempo_maximo = tiempo_maximo  # Segundos que se espera un resultado antes de darlo por perdido
+        self.descartados = 0
+        self.perdidos = 0  # Fotogramas cuyo trabajador murió o se colgó
+        self.reinicios = 0
+
+        forma = (self.num_huecos, int(np.prod(self.forma_frame)))
+        tamaño = int(np.prod(forma)) * np.dtype(tipo).itemsize
+        self._memoria = shared_memory.SharedMemory(create=True, size=tamaño)
+        self._huecos = np.ndarray(forma, dtype=tipo, buffer=self._memoria.buf)
+        self._libres = list(range(self.num_huecos))
+        self._pendientes = deque()  # (secuencia, hueco, instante de envío), en orden de captura
+        self._terminados = {}  # secuencia -> resultado recibido fuera de orden
+
+        self._contexto = _contexto_multiproceso()
+        self._argumentos = (self._memoria.name, forma, tipo, opciones_detector or {}, backend, opciones_backend or {},
+                            ruta_mapa, ruta_calibracion)
+        self._lanzar_trabajadores()
+
+    def _lanzar_trabajadores(self):
+        self._tareas = self._contexto.Queue()
+        self._resultados = self._contexto.Queue()
+        self._trabajadores = [
+            self._contexto.Process(target=_bucle_trabajador, name=f'DecodificadorQR-{i}', daemon=True,
+                                   args=self._argumentos + (self._tareas, self._resultados))
+            for i in range(self.num_trabajadores)]
+        for trabajador in self._trabajadores:
+            trabajador.start()
+
+    def enviar(self, capturado, dibujar=False, escalas=None):
+        """
+        Función para copiar un fotograma a un hueco libre y encargar su decodificación.
+        Devuelve False (y el fotograma se descarta) si no queda ningún hueco libre o no cabe en él.
+        `escalas` cambia, si se indica, los niveles de la pirámide que prueba el trabajador.
+        """
+        if not self._libres or capturado.frame.size > self._huecos.shape[1]:
+            self.descartados += 1
+            return False
+        hueco = self._libres.pop()
+        forma = capturado.frame.shape
+        _vista_hueco(self._huecos, hueco, forma)[...] = capturado.frame
+        self._pendientes.append((capturado.secuencia, hueco, time.monotonic()))
+        self._tareas.put((hueco, forma, capturado.secuencia, capturado.marca_tiempo, dibujar,
+                          tuple(escalas) if escalas is not None else None))
+        return True
+
+    def en_vuelo(self):
+        return len(self._pendientes)
+
+    def resultados(self, timeout=0.0):
+        """
+        Función generadora que entrega, en orden de secuencia, los resultados ya disponibles.
+        El fotograma de cada resultado apunta a memoria compartida y sólo es válido hasta pedir el
+        siguiente resultado; después su hueco se reutiliza.
+        """
+        self._recoger(timeout)
+        while self._pendientes:
+            secuencia, hueco, enviado = self._pendientes[0]
+            if secuencia not in self._terminados:
+                if time.monotonic() - enviado < self.tiempo_maximo:
+                    break
+                # El trabajador de este fotograma murió o se colgó: se da por perdido para no retener a los
+                # siguientes y se libera su hueco (un resultado que llegue después se ignora)
+                self._pendientes.popleft()
+                self._libres.append(hueco)
+                self.perdidos += 1
+                self._revisar_trabajadores()
+                continue
+            self._pendientes.popleft()
+            (_, marca_tiempo, hueco, forma, objetos, coordenadas_dron, calidad,
+             orientacion) = self._terminados.pop(secuencia)
+            try:
+                yield ResultadoDecodificacion(secuencia, marca_tiempo, _vista_hueco(self._huecos, hueco, forma),
+                                              objetos, coordenadas_dron, calidad, orientacion)
+            finally:
+                self._libres.append(hueco)
+            self._recoger(0.0)
+
+    def _recoger(self, timeout):
+        bloquear = timeout > 0
+        while True:
+            try:
+                resultado = self._resultados.get(block=bloquear, timeout=timeout if bloquear else None)
+            except queue.Empty:
+                return
+            # Los resultados de fotogramas ya dados por perdidos no se esperan (su hueco ya está libre)
+            if self._pendientes and resultado[0] >= self._pendientes[0][0]:
+                self._terminados[resultado[0]] = resultado
+            bloquear = False
+
+    def _revisar_trabajadores(self):
+        # Si ha muerto algún trabajador (por ejemplo, un fallo del decodificador), puede haberse llevado el
+        # cerrojo de una cola: se paran todos y se lanzan de nuevo con colas nuevas. Los fotogramas que
+        # estaban en las colas viejas se dan por perdidos
+        if all(trabajador.is_alive() for trabajador in self._trabajadores):
+            return
+        for trabajador in self._trabajadores:
+            trabajador.terminate()
+            trabajador.join(timeout=1.0)
+        self.perdidos += len(self._pendientes)
+        self._libres.extend(hueco for _, hueco, _ in self._pendientes)
+        self._pendientes.clear()
+        self._terminados.clear()
+        self.reinicios += 1
+        self._lanzar_trabajadores()
+
+    def cerrar(self):
+        """
+        Función para parar los trabajadores y liberar la memoria compartida.
+        """
+        for _ in self._trabajadores:
+            self._tareas.put(None)
+        for trabajador in self._trabajadores:
+            trabajador.join(timeout=2.0)
+            if trabajador.is_alive():
+                trabajador.terminate()
+        del self._huecos
+        self._memoria.close()
+        self._memoria.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.cerrar()
@@ -0,0 +1,241 @@
+# ######################################################################################################
+#                                     Proyecto de Localización de Drones
+# Módulo del registro de vuelo
+#
+# Descripción:
+# Registro binario de sólo añadir, con registros de tamaño fijo, de todo lo que detecta el bucle: marca de
+# tiempo, ID y esquinas de cada marcador, la pose calculada y los tiempos de las etapas. El fichero se
+# proyecta en memoria (mmap) y se reserva por bloques, ampliándolo en segundo plano antes de que se llene,
+# así que anotar un fotograma es copiar unos bytes y nunca frena el bucle. Para el análisis posterior,
+# `leer_registro_vuelo` devuelve el fichero como un array estructurado de NumPy (np.memmap), sobre el que
+# se pueden calcular estadísticas o recalcular poses de forma vectorizada aunque haya millones de registros.
+#
+# Uso:
+#   python registro_vuelo.py vuelo.bin
+# ######################################################################################################
+
+import argparse
+import mmap
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+
+from detector_qr import esquinas_cuadrilatero
+
+MAGICO = b'DRONLOG1'
+VERSION_REGISTRO = 1
+CABECERA = struct.Struct('<8sIIQ8x')  # mágico, versión, tamaño del registro, número de registros
+ETAPAS_REGISTRO = ('decodificacion', 'geometria', 'total_deteccion', 'latencia')
+
+# Un registro por marcador detectado; los fotogramas sin ningún marcador dejan uno con id_marcador = -2.
+# id_marcador = -1 es un marcador que no lleva un ID numérico (contenido "lado,x,y")
+DTYPE_REGISTRO = np.dtype([
+    ('marca_tiempo', '<f8'),
+    ('secuencia', '<u4'),
+    ('ancho', '<u2'),
+    ('alto', '<u2'),
+    ('id_marcador', '<i4'),
+    ('esquinas', '<f4', (4, 2)),
+    ('referencia', '<f4', (3,)),  # lado_cm, x, y del mapa (NaN si el marcador no es válido)
+    ('coordenadas_dron', '<f4', (3,)),
+    ('orientacion', '<f4', (3,)),
+    ('calidad', '<f4'),
+    ('num_qr', '<u2'),
+    ('tiempos_ms', '<f4', (len(ETAPAS_REGISTRO),)),
+])
+SIN_MARCADOR = -2
+SIN_ID = -1
+
+
+class RegistroVuelo:
+    """
+    Clase que añade registros a un fichero proyectado en memoria y reservado por bloques.
+    """
+    def __init__(self, ruta, mapa=None, registros_por_bloque=65536):
+        self.ruta = ruta
+        self.mapa = mapa
+        self.registros_por_bloque = registros_por_bloque
+        self.num_registros = 0
+        self.ampliaciones = 0
+        self._fichero = open(ruta, 'w+b')
+        self._capacidad = 0
+        self._mmap = None
+        self._registros = None
+        self._ampliacion = None  # Hilo que reserva el bloque siguiente
+        self._tamaño_reservado = 0
+        self._reservar(registros_por_bloque)
+        self._proyectar()
+        self._mmap[:CABECERA.size] = CABECERA.pack(MAGICO, VERSION_REGISTRO, DTYPE_REGISTRO.itemsize, 0)
+
+    def _tamaño_para(self, capacidad):
+        return CABECERA.size + capacidad * DTYPE_REGISTRO.itemsize
+
+    def _reservar(self, capacidad):
+        # posix_fallocate reserva los bloques en disco de verdad; truncate sólo deja un fichero disperso
+        tamaño = self._tamaño_para(capacidad)
+        if hasattr(os, 'posix_fallocate'):
+            os.posix_fallocate(self._fichero.fileno(), 0, tamaño)
+        else:
+            self._fichero.truncate(tamaño)
+        self._tamaño_reservado = capacidad
+
+    def _proyectar(self):
+        if self._registros is not None:
+            del self._registros
+            self._mmap.close()
+        self._capacidad = self._tamaño_reservado
+        self._mmap = mmap.mmap(self._fichero.fileno(), self._tamaño_para(self._capacidad))
+        self._registros = np.frombuffer(self._mmap, dtype=DTYPE_REGISTRO, count=self._capacidad,
+                                        offset=CABECERA.size)
+
+    def _asegurar_hueco(self, necesarios):
+        # Al pasar de 3/4 del bloque se reserva el siguiente en segundo plano; al llenarse sólo hay que
+        # volver a proyectar, que es barato porque el disco ya está reservado
+        if self._ampliacion is None and self.num_registros + necesarios > self._capacidad * 3 // 4:
+            capacidad = self._capacidad + self.registros_por_bloque
+            self._ampliacion = threading.Thread(target=self._reservar, args=(capacidad,), daemon=True)
+            self._ampliacion.start()
+        if self.num_registros + necesarios <= self._capacidad:
+            return
+        self._ampliacion.join()
+        self._ampliacion = None
+        while self._tamaño_reservado < self.num_registros + necesarios:
+            self._reservar(self._tamaño_reservado + self.registros_por_bloque)
+        self._proyectar()
+        self.ampliaciones += 1
+
+    def anotar(self, capturado, forma_frame, objetos_decodificados, coordenadas_dron, calidad, orientacion=None,
+               tiempos=None):
+        """
+        Función para añadir los registros de un fotograma: uno por marcador, o uno vacío si no hay ninguno.
+        `tiempos` es un diccionario etapa -> segundos (por ejemplo, Instrumentacion.nuevo_fotograma()).
+        """
+        necesarios = max(1, len(objetos_decodificados))
+        self._asegurar_hueco(necesarios)
+        bloque = self._registros[self.num_registros:self.num_registros + necesarios]
+
+        tiempos = dict(tiempos or {})
+        tiempos['latencia'] = time.monotonic() - capturado.marca_tiempo
+        bloque['marca_tiempo'] = capturado.marca_tiempo
+        bloque['secuencia'] = capturado.secuencia
+        bloque['alto'], bloque['ancho'] = forma_frame[0], forma_frame[1]
+        bloque['coordenadas_dron'] = coordenadas_dron if coordenadas_dron is not None else np.nan
+        bloque['orientacion'] = orientacion if orientacion is not None else np.nan
+        bloque['calidad'] = calidad
+        bloque['num_qr'] = len(objetos_decodificados)
+        bloque['tiempos_ms'] = [tiempos.get(etapa, np.nan) * 1000 for etapa in ETAPAS_REGISTRO]
+
+        if not objetos_decodificados:
+            bloque['id_marcador'] = SIN_MARCADOR
+            bloque['esquinas'] = np.nan
+            bloque['referencia'] = np.nan
+        for registro, obj in zip(bloque, objetos_decodificados):
+            texto = obj.data.decode('utf-8', errors='replace')
+            registro['id_marcador'] = int(texto) if texto.isdigit() else SIN_ID
+            registro['esquinas'] = esquinas_cuadrilatero(obj.polygon)
+            referencia = self.mapa.valores(texto) if self.mapa is not None else (None, None, None)
+            registro['referencia'] = [np.nan if v is None else v for v in referencia]
+
+        self.num_registros += necesarios
+        self._mmap[:CABECERA.size] = CABECERA.pack(MAGICO, VERSION_REGISTRO, DTYPE_REGISTRO.itemsize,
+                                                   self.num_registros)
+
+    def cerrar(self):
+        """
+        Función para volcar el registro a disco y recortar el espacio reservado que no se ha usado.
+        """
+        if self._ampliacion is not None:
+            self._ampliacion.join()
+        self._mmap.flush()
+        del self._registros
+        self._mmap.close()
+        self._fichero.truncate(self._tamaño_para(self.num_registros))
+        self._fichero.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.cerrar()
+
+
+def leer_registro_vuelo(ruta):
+    """
+    Función que devuelve los registros válidos del fichero como np.memmap de sólo lectura (sin copiarlos).
+    """
+    with open(ruta, 'rb') as fichero:
+        magico, version, tamaño_registro, num_registros = CABECERA.unpack(fichero.read(CABECERA.size))
+    if magico != MAGICO or version != VERSION_REGISTRO or tamaño_registro != DTYPE_REGISTRO.itemsize:
+        raise ValueError(f"{ruta} no es un registro de vuelo compatible (versión {version})")
+    if num_registros == 0:
+        return np.zeros(0, dtype=DTYPE_REGISTRO)
+    return np.memmap(ruta, dtype=DTYPE_REGISTRO, mode='r', offset=CABECERA.size, shape=(num_registros,))
+
+
+def resumen_vuelo(registros):
+    """
+    Función que calcula de forma vectorizada las estadísticas principales de un registro de vuelo.
+    """
+    if len(registros) == 0:
+        return {'registros': 0}
+    secuencias, inicio_fotograma = np.unique(registros['secuencia'], return_index=True)
+    fotogramas = registros[inicio_fotograma]
+    con_pose = ~np.isnan(fotogramas['coordenadas_dron'][:, 0])
+    duracion = float(fotogramas['marca_tiempo'].max() - fotogramas['marca_tiempo'].min())
+    marcadores = registros['id_marcador'][registros['id_marcador'] >= 0]
+    ids, apariciones = np.unique(marcadores, return_counts=True)
+    latencias = fotogramas['tiempos_ms'][:, ETAPAS_REGISTRO.index('latencia')]
+    p50, p95, p99 = np.nanpercentile(latencias, [50, 95, 99])
+    posiciones = fotogramas['coordenadas_dron'][con_pose]
+    return {
+        'registros': len(registros),
+        'fotogramas': len(secuencias),
+        'duracion_s': duracion,
+        'tasa_pose': float(con_pose.mean()),
+        'poses_por_segundo': float(con_pose.sum() / duracion) if duracion > 0 else 0.0,
+        'latencia_p50_ms': float(p50),
+        'latencia_p95_ms': float(p95),
+        'latencia_p99_ms': float(p99),
+        'apariciones_por_marcador': dict(zip(ids.tolist(), apariciones.tolist())),
+        'extension_m': (posiciones.max(axis=0) - posiciones.min(axis=0)).tolist() if len(posiciones) else None,
+    }
+
+
+def recalcular_posiciones(registros, detector):
+    """
+    Función para recalcular con otro DetectorQR (otra calibración, por ejemplo) la posición que da cada
+    marcador válido. Devuelve los índices de los registros usados y sus posiciones (N, 3).
+    """
+    validos = np.flatnonzero(~np.isnan(registros['referencia'][:, 0]) & (registros['id_marcador'] != SIN_MARCADOR))
+    indices, posiciones = [], []
+    # Se agrupan por resolución porque calcular_posiciones trabaja con una sola forma de fotograma
+    for ancho, alto in np.unique(np.stack([registros['ancho'][validos], registros['alto'][validos]], axis=1),
+                                 axis=0):
+        grupo = validos[(registros['ancho'][validos] == ancho) & (registros['alto'][validos] == alto)]
+        esquinas = registros['esquinas'][grupo].astype(np.float64)
+        referencias = registros['referencia'][grupo].astype(np.float64)
+        longitudes_lado = detector.calcular_longitudes_lado(esquinas)
+        resultado = detector.calcular_posiciones(esquinas, longitudes_lado, referencias, (int(alto), int(ancho)))
+        validas = resultado[4]  # Se omiten los marcadores sin una pose creíble
+        indices.append(grupo[validas])
+        posiciones.append(resultado[0][validas])
+    if not indices:
+        return np.zeros(0, dtype=np.intp), np.zeros((0, 3))
+    return np.concatenate(indices), np.concatenate(posiciones)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Resumen de un registro de vuelo')
+    parser.add_argument('ruta', help='Fichero escrito por RegistroVuelo')
+    args = parser.parse_args()
+
+    resumen = resumen_vuelo(leer_registro_vuelo(args.ruta))
+    for clave, valor in resumen.items():
+        print(f"{clave}: {valor}")
+
+
+if __name__ == "__main__":
+    main()
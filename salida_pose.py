@@ -0,0 +1,101 @@
+# ######################################################################################################
+#                                     Proyecto de Localización de Drones
+# Módulo de salida de la pose
+#
+# Descripción:
+# Publica las coordenadas del dron como registros estructurados (una línea JSON por pose) por la salida
+# estándar, por un socket UDP o por un socket Unix local. Los envíos nunca bloquean el bucle de visión:
+# si el destino no está disponible, el registro se descarta y se cuenta como error.
+# ######################################################################################################
+
+import json
+import socket
+import sys
+
+
+def registro_pose(capturado, coordenadas_dron, num_qr, calidad, orientacion=None):
+    """
+    Función para construir el registro que se publica a partir de un fotograma y su pose.
+    La orientación (guiñada, cabeceo, alabeo) en radianes se añade si se conoce.
+    """
+    x, y, z = coordenadas_dron
+    registro = {
+        'secuencia': capturado.secuencia,
+        'marca_tiempo': capturado.marca_tiempo,
+        'x': x,
+        'y': y,
+        'z': z,
+        'num_qr': num_qr,
+        'calidad': calidad,
+    }
+    if orientacion is not None:
+        registro['guinada'], registro['cabeceo'], registro['alabeo'] = (float(v) for v in orientacion)
+    return registro
+
+
+class PublicadorPose:
+    """
+    Clase que serializa los registros de pose y los envía al destino configurado.
+    """
+    def __init__(self, destino='stdout'):
+        self.destino = destino
+        self.enviados = 0
+        self.errores = 0
+        self._socket = None
+        self._direccion = None
+
+        if destino == 'stdout':
+            return
+        if destino.startswith('udp://'):
+            host, puerto = destino[len('udp://'):].rsplit(':', 1)
+            self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self._direccion = (host, int(puerto))
+        elif destino.startswith('unix://'):
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self._direccion = destino[len('unix://'):]
+        else:
+            raise ValueError(f"Destino de pose no soportado: {destino}")
+        self._socket.setblocking(False)
+
+    def publicar(self, registro):
+        """
+        Función para enviar un registro sin bloquear. Devuelve True si se ha enviado.
+        """
+        linea = json.dumps(registro, separators=(',', ':')) + '\n'
+        try:
+            if self._socket is None:
+                sys.stdout.write(linea)
+                sys.stdout.flush()
+            else:
+                self._socket.sendto(linea.encode('utf-8'), self._direccion)
+        except OSError:
+            self.errores += 1
+            return False
+        self.enviados += 1
+        return True
+
+    def cerrar(self):
+        """
+        Función para liberar el socket, si lo hay.
+        """
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+
+class PublicadorMultiple:
+    """
+    Clase que reenvía cada registro a varios publicadores (por ejemplo, UDP y el enlace serie).
+    """
+    def __init__(self, publicadores):
+        self.publicadores = list(publicadores)
+
+    def publicar(self, registro):
+        enviado = False
+        for publicador in self.publicadores:
+            enviado = publicador.publicar(registro) or enviado
+        return enviado
+
+    def cerrar(self):
+        for publicador in self.publicadores:
+            publicador.cerrar()
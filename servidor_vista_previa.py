@@ -0,0 +1,259 @@
+# ######################################################################################################
+#                                     Proyecto de Localización de Drones
+# Módulo del servidor de vista previa
+#
+# Descripción:
+# Envía la vista previa (anotada o en bruto) a la estación de tierra cuando el dron vuela sin monitor.
+# El bucle de visión sólo deja una copia del fotograma en un buzón de un hueco; un hilo propio la reduce
+# a la resolución máxima, la comprime en JPEG y la sirve como MJPEG por HTTP (se ve en un navegador o en
+# VLC) o la envía por UDP en un datagrama por fotograma. La frecuencia está limitada y, si el hilo o un
+# cliente van retrasados, se saltan fotogramas en lugar de frenar al detector: cada cliente recibe
+# siempre el JPEG más reciente. Por HTTP, sin clientes conectados no se copia ni se comprime nada.
+#
+# Uso:
+#   http://<ip del dron>:8080/ en el navegador (o /instantanea.jpg para un solo fotograma)
+#   python servidor_vista_previa.py --recibir udp://0.0.0.0:5600
+# ######################################################################################################
+
+import argparse
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+import numpy as np
+
+from instrumentacion import Instrumentacion
+
+LIMITE_DATAGRAMA = 65000  # Bytes útiles de un datagrama UDP, con margen para las cabeceras
+SEPARADOR = b'fotograma'
+
+
+class _ManejadorMJPEG(BaseHTTPRequestHandler):
+    def do_GET(self):
+        vista = self.server.vista_previa
+        if self.path.startswith('/instantanea'):
+            # Mientras espera cuenta como cliente, para que el bucle vuelva a comprimir fotogramas
+            vista.cambiar_clientes(1)
+            try:
+                jpeg, _ = vista.esperar_jpeg(-1, timeout=2.0)
+            finally:
+                vista.cambiar_clientes(-1)
+            if jpeg is None:
+                self.send_error(503, 'Sin fotogramas')
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/jpeg')
+            self.send_header('Content-Length', str(len(jpeg)))
+            self.end_headers()
+            self.wfile.write(jpeg)
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'multipart/x-mixed-replace; boundary=' + SEPARADOR.decode())
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        # Un cliente lento sólo bloquea su propio hilo y, al volver, recibe el JPEG más reciente
+        self.connection.settimeout(2.0)
+        vista.cambiar_clientes(1)
+        try:
+            numero = -1
+            while vista.activo:
+                jpeg, nuevo = vista.esperar_jpeg(numero, timeout=1.0)
+                if jpeg is None:
+                    continue
+                if numero >= 0:
+                    vista.saltados_clientes += nuevo - numero - 1
+                numero = nuevo
+                self.wfile.write(b'--' + SEPARADOR + b'\r\nContent-Type: image/jpeg\r\nContent-Length: '
+                                 + str(len(jpeg)).encode() + b'\r\n\r\n' + jpeg + b'\r\n')
+        except OSError:
+            pass  # Cliente desconectado o que no lee
+        finally:
+            vista.cambiar_clientes(-1)
+
+    def log_message(self, *args):
+        pass
+
+
+class ServidorVistaPrevia:
+    """
+    Clase que comprime y envía la vista previa desde un hilo propio, sin bloquear nunca al llamante.
+    `destino` puede ser "http://0.0.0.0:8080" o "udp://host:puerto".
+    """
+    def __init__(self, destino, frecuencia_maxima=10.0, ancho_maximo=640, calidad_jpeg=70, instrumentacion=None):
+        self.destino = destino
+        self.periodo = 1.0 / frecuencia_maxima
+        self.ancho_maximo = ancho_maximo
+        self.calidad_jpeg = calidad_jpeg
+        self.instrumentacion = instrumentacion if instrumentacion is not None else Instrumentacion(activa=False)
+        self.activo = True
+        self.codificados = 0
+        self.sustituidos = 0  # Fotogramas que no se llegaron a comprimir porque llegó otro más nuevo
+        self.descartados = 0  # JPEG que no se pudieron enviar por UDP (buffer lleno o demasiado grandes)
+        self.saltados_clientes = 0  # JPEG que algún cliente HTTP no llegó a recibir por ir lento
+        self.clientes = 0
+        self._siguiente = 0.0
+        self._pendiente = None
+        self._jpeg = None
+        self._numero = -1
+        self._condicion = threading.Condition()
+        self._condicion_jpeg = threading.Condition()
+        self._servidor_http = None
+        self._socket = None
+        self._direccion = None
+
+        if destino.startswith('http://'):
+            host, puerto = destino[len('http://'):].rstrip('/').rsplit(':', 1)
+            self._servidor_http = ThreadingHTTPServer((host, int(puerto)), _ManejadorMJPEG)
+            self._servidor_http.daemon_threads = True
+            self._servidor_http.vista_previa = self
+            threading.Thread(target=self._servidor_http.serve_forever, name='VistaPreviaHTTP', daemon=True).start()
+        elif destino.startswith('udp://'):
+            host, puerto = destino[len('udp://'):].rsplit(':', 1)
+            self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self._socket.setblocking(False)
+            self._direccion = (host, int(puerto))
+        else:
+            raise ValueError(f"Destino de vista previa no soportado: {destino}")
+        self._hilo = threading.Thread(target=self._bucle_codificacion, name='VistaPrevia', daemon=True)
+        self._hilo.start()
+
+    @property
+    def direccion(self):
+        # Dirección real del servidor HTTP (útil con el puerto 0 en las pruebas)
+        return self._servidor_http.server_address if self._servidor_http is not None else self._direccion
+
+    def toca(self, ahora=None):
+        """
+        Función que dice si se aceptaría un fotograma ahora: hay alguien mirando y ya ha pasado el periodo.
+        Es sólo una comparación, para decidir antes si merece la pena anotar el fotograma.
+        """
+        if self._servidor_http is not None and self.clientes == 0:
+            return False
+        return (time.monotonic() if ahora is None else ahora) >= self._siguiente
+
+    def ofrecer(self, frame):
+        """
+        Función para dejar una copia del fotograma en el buzón si toca. Devuelve True si se ha aceptado.
+        """
+        ahora = time.monotonic()
+        if not self.toca(ahora):
+            return False
+        self._siguiente = ahora + self.periodo
+        copia = frame.copy()  # El fotograma se sigue usando (o es un hueco de memoria compartida)
+        with self._condicion:
+            if self._pendiente is not None:
+                self.sustituidos += 1
+            self._pendiente = copia
+            self._condicion.notify()
+        return True
+
+    def _bucle_codificacion(self):
+        while True:
+            with self._condicion:
+                while self.activo and self._pendiente is None:
+                    self._condicion.wait()
+                if not self.activo:
+                    return
+                frame, self._pendiente = self._pendiente, None
+
+            with self.instrumentacion.medir('codificacion_jpeg'):
+                if frame.shape[1] > self.ancho_maximo:
+                    alto = int(round(frame.shape[0] * self.ancho_maximo / frame.shape[1]))
+                    frame = cv2.resize(frame, (self.ancho_maximo, alto), interpolation=cv2.INTER_AREA)
+                jpeg = self._codificar(frame)
+            self.codificados += 1
+            if self._socket is not None:
+                self._enviar_udp(jpeg)
+            else:
+                with self._condicion_jpeg:
+                    self._jpeg = jpeg
+                    self._numero += 1
+                    self._condicion_jpeg.notify_all()
+
+    def _codificar(self, frame):
+        calidad = self.calidad_jpeg
+        jpeg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, calidad])[1].tobytes()
+        # Por UDP cada fotograma tiene que caber en un datagrama: se baja la calidad hasta que quepa
+        while self._socket is not None and len(jpeg) > LIMITE_DATAGRAMA and calidad > 20:
+            calidad -= 15
+            jpeg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, calidad])[1].tobytes()
+        return jpeg
+
+    def _enviar_udp(self, jpeg):
+        try:
+            self._socket.sendto(jpeg, self._direccion)
+        except OSError:  # Incluye BlockingIOError con el buffer de envío lleno y los datagramas demasiado grandes
+            self.descartados += 1
+            self.instrumentacion.contar('vista_previa_descartados')
+
+    def esperar_jpeg(self, numero_anterior, timeout=1.0):
+        """
+        Función que espera a que haya un JPEG posterior a `numero_anterior` y lo devuelve con su número.
+        """
+        with self._condicion_jpeg:
+            if self._numero <= numero_anterior:
+                self._condicion_jpeg.wait(timeout)
+            if self._numero <= numero_anterior or self._jpeg is None:
+                return None, numero_anterior
+            return self._jpeg, self._numero
+
+    def cambiar_clientes(self, cambio):
+        with self._condicion_jpeg:
+            self.clientes += cambio
+
+    def cerrar(self):
+        """
+        Función para parar el hilo de compresión y el servidor.
+        """
+        self.activo = False
+        with self._condicion:
+            self._condicion.notify()
+        with self._condicion_jpeg:
+            self._condicion_jpeg.notify_all()
+        self._hilo.join(timeout=1.0)
+        if self._servidor_http is not None:
+            self._servidor_http.shutdown()
+            self._servidor_http.server_close()
+        if self._socket is not None:
+            self._socket.close()
+
+
+def recibir_udp(destino):
+    """
+    Función que hace de estación de tierra para el modo UDP: recibe los JPEG y los muestra en una ventana.
+    """
+    host, puerto = destino[len('udp://'):].rsplit(':', 1)
+    receptor = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receptor.bind((host, int(puerto)))
+    recibidos = 0
+    inicio = time.monotonic()
+    while True:
+        datos, _ = receptor.recvfrom(65536)
+        frame = cv2.imdecode(np.frombuffer(datos, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            continue
+        recibidos += 1
+        frecuencia = recibidos / max(time.monotonic() - inicio, 1e-6)
+        cv2.putText(frame, f"{frecuencia:.1f} fps", (10, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1,
+                    cv2.LINE_AA)
+        cv2.imshow('Vista previa', frame)
+        if cv2.waitKey(1) & 0xFF == ord('q'):
+            break
+    cv2.destroyAllWindows()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Receptor de la vista previa por UDP')
+    parser.add_argument('--recibir', required=True, help='udp://0.0.0.0:puerto')
+    args = parser.parse_args()
+    try:
+        recibir_udp(args.recibir)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()